@@ -0,0 +1,306 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+from classes import AddressBook, Record, Phone, Birthday, Email, Address
+from notes import Notes
+from storage import PickleStorage, MappedStorage, ShardedStorage
+from mapped import write_mapped
+
+QUERIES = 100
+WORDS = ('meeting', 'project', 'birthday', 'shopping', 'travel', 'invoice', 'doctor', 'family',
+         'report', 'holiday', 'budget', 'garden', 'music', 'recipe', 'training', 'review')
+EXTENSIONS = ('.jpg', '.png', '.pdf', '.docx', '.mp3', '.mp4', '.zip', '.py', '.txt', '.csv', '.xyz', '')
+
+
+class DictField:
+    # the layout fields had before they got slots, kept only to compare against
+    def __init__(self, value):
+        self.value = value
+
+
+class DictRecord:
+    def __init__(self, name, phone, birthday, email, address):
+        self.name = DictField(name)
+        self.phones = [DictField(phone)]
+        self.birthday = DictField(birthday)
+        self.email = DictField(email)
+        self.address = DictField(address)
+
+
+def contact_fields(i):
+    return (f'contact{i}', f'{i:010d}', f'{i % 28 + 1:02d}.{i % 12 + 1:02d}.19{i % 100:02d}',
+            f'user{i}@mail.com', f'{i} Main street')
+
+
+def slotted_record(name, phone, birthday, email, address):
+    return Record(name, Phone(phone), Birthday(birthday), Email(email), Address(address))
+
+
+def synthetic_records(count):
+    return [slotted_record(*contact_fields(i)) for i in range(count)]
+
+
+def synthetic_book(count):
+    book = AddressBook()
+    for record in synthetic_records(count):
+        book.add_record(record)
+    return book
+
+
+def synthetic_notes(count, tags=100, seed=0):
+    # (title, text, tag name) with a few random words each, so searches hit a realistic share of notes
+    rng = random.Random(seed)
+    for i in range(count):
+        yield f'note{i}', ' '.join(rng.choices(WORDS, k=8)), f'tag{i % tags}'
+
+
+def synthetic_tree(root, count, per_folder=100):
+    # empty files with mixed extensions, two levels deep
+    for i in range(count):
+        folder = os.path.join(root, f'd{i // (per_folder * per_folder)}', f'd{i // per_folder % per_folder}')
+        if i % per_folder == 0:
+            os.makedirs(folder, exist_ok=True)
+        open(os.path.join(folder, f'file{i}{EXTENSIONS[i % len(EXTENSIONS)]}'), 'wb').close()
+
+
+def elapsed(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+def per_query(function, queries):
+    # mean seconds per call over the given arguments
+    started = time.perf_counter()
+    for query in queries:
+        function(query)
+    return (time.perf_counter() - started) / len(queries)
+
+
+def sample_names(count, rng):
+    return [f'contact{rng.randrange(count)}' for _ in range(QUERIES)]
+
+
+def bytes_per_contact(build, count):
+    tracemalloc.start()
+    contacts = [build(*contact_fields(i)) for i in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del contacts
+    return size / count
+
+
+def memory(count):
+    slotted = bytes_per_contact(slotted_record, count)
+    with_dict = bytes_per_contact(DictRecord, count)
+    return {
+        'slotted_bytes_per_contact': round(slotted),
+        'dict_bytes_per_contact': round(with_dict),
+        'saved': round(1 - slotted / with_dict, 3),
+    }
+
+
+def contacts(count):
+    rng = random.Random(0)
+    records = synthetic_records(count)
+    book = AddressBook()
+
+    def add_all():
+        for record in records:
+            book.add_record(record)
+
+    add_seconds = elapsed(add_all)
+    # the first lookup builds the name index; it is reported on its own
+    index_seconds = elapsed(book.find, 'contact0')
+    return {
+        'add_record_seconds': add_seconds / count,
+        'find_index_build_seconds': index_seconds,
+        'find_exact_seconds': per_query(book.find, sample_names(count, rng)),
+        'find_substring_seconds': per_query(book.find, [str(rng.randrange(count)) for _ in range(QUERIES)]),
+        'get_records_seconds': elapsed(book.get_records),
+    }
+
+
+def bot_queries(count):
+    # Bot commands answered from an in-memory book; the storage files are
+    # never touched since the book is handed to the bot directly
+    from bot import Bot
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as folder:
+        current = os.getcwd()
+        os.chdir(folder)
+        try:
+            bot = Bot()
+            bot._book = synthetic_book(count)
+
+            def search_phone(digits):
+                bot.arguments = deque([digits])
+                return bot.search_phone()
+
+            index_seconds = elapsed(search_phone, '0000')
+            result = {
+                'search_phone_index_build_seconds': index_seconds,
+                'search_phone_seconds': per_query(search_phone, [f'{rng.randrange(count):06d}' for _ in range(QUERIES)]),
+                'birthday_30_days_seconds': elapsed(bot.birthday, 30),
+                'birthday_7_days_seconds': elapsed(bot.birthday, 7),
+            }
+            bot.storage.close()
+            bot.arguments = None
+            return result
+        finally:
+            os.chdir(current)
+
+
+def notes(count):
+    rng = random.Random(0)
+    generated = list(synthetic_notes(count))
+    book = Notes()
+    for tag in sorted({tag for _, _, tag in generated}):
+        book.tags.add_tag(tag)
+
+    def add_all():
+        for title, text, tag in generated:
+            book.add_note(title, text)
+            book.add_tag_for_note(tag, title)
+
+    add_seconds = elapsed(add_all)
+    index_seconds = elapsed(book.find_notes, WORDS[0])
+    return {
+        'add_note_seconds': add_seconds / count,
+        'find_notes_index_build_seconds': index_seconds,
+        'find_notes_seconds': per_query(book.find_notes, [' '.join(rng.sample(WORDS, 2)) for _ in range(QUERIES)]),
+        'find_notes_prefix_seconds': per_query(book.find_notes, [rng.choice(WORDS)[:3] for _ in range(QUERIES)]),
+        'find_notes_by_tag_seconds': per_query(lambda tag: book.find_notes_by_tag(tag_name=tag),
+                                               [f'tag{rng.randrange(100)}' for _ in range(10)]),
+    }
+
+
+def pickle_storage(count):
+    book = synthetic_book(count)
+    with tempfile.TemporaryDirectory() as folder:
+        contacts_file = os.path.join(folder, 'contacts.bin')
+        notes_file = os.path.join(folder, 'notes.bin')
+
+        storage = PickleStorage(contacts_file, notes_file)
+        storage.load('contacts', book)
+        save_seconds = elapsed(storage.snapshot, 'contacts')
+        storage.close()
+
+        storage = PickleStorage(contacts_file, notes_file)
+        load_seconds = elapsed(storage.load, 'contacts', AddressBook())
+        storage.close()
+        return {
+            'save_seconds': save_seconds,
+            'load_seconds': load_seconds,
+            'file_bytes': os.path.getsize(contacts_file),
+        }
+
+
+def mapped_storage(count):
+    # the same book in the mapped format: opening it, and the first lookups, which build their records
+    records = sorted(synthetic_records(count), key=lambda record: record.name.value)
+    names = sample_names(count, random.Random(0))
+    with tempfile.TemporaryDirectory() as folder:
+        contacts_file = os.path.join(folder, 'contacts.map')
+        with open(contacts_file, 'wb') as file:
+            save_seconds = elapsed(write_mapped, file, records)
+        del records
+
+        storage = MappedStorage(contacts_file, os.path.join(folder, 'notes.bin'), autosave_interval=0)
+        book = AddressBook()
+        load_seconds = elapsed(storage.load, 'contacts', book)
+        result = {
+            'save_seconds': save_seconds,
+            'load_seconds': load_seconds,
+            'file_bytes': os.path.getsize(contacts_file),
+            'find_seconds': per_query(book.find, names),
+            'search_phone_seconds': per_query(book.search_phone, ['1234', '5678', '90']),
+            'birthdays_seconds': elapsed(book.birthdays, 7),
+        }
+        storage.close()
+        return result
+
+
+def sharded_storage(count):
+    # the same book in mapped shards: writing them, opening them, and scans that the worker pool spreads over them
+    with tempfile.TemporaryDirectory() as folder:
+        contacts_file = os.path.join(folder, 'contacts.map')
+        notes_file = os.path.join(folder, 'notes.bin')
+        storage = ShardedStorage(contacts_file, notes_file, autosave_interval=0)
+        shards = [[] for _ in storage.shard_kinds]
+        for record in synthetic_records(count):
+            shards[storage.number_of(record.name.value)].append(record)
+
+        started = time.perf_counter()
+        for kind, records in zip(storage.shard_kinds, shards):
+            with open(storage.files[kind], 'wb') as file:
+                write_mapped(file, sorted(records, key=lambda record: record.name.value))
+        save_seconds = time.perf_counter() - started
+        del shards
+
+        book = AddressBook()
+        load_seconds = elapsed(storage.load, 'contacts', book)
+        # the first scan also starts the workers
+        first_scan_seconds = elapsed(book.search_phone, '1234')
+        result = {
+            'shards': len(storage.shard_kinds),
+            'workers': storage.workers,
+            'save_seconds': save_seconds,
+            'load_seconds': load_seconds,
+            'first_scan_seconds': first_scan_seconds,
+            'search_phone_seconds': per_query(book.search_phone, ['1234', '5678', '90']),
+            'find_substring_seconds': per_query(lambda text: sum(len(page) for page in book.find_all(text)), ['12', '345', '6789']),
+        }
+        storage.close()
+        return result
+
+
+def folder_sort(count):
+    from folder_sorter import sort_folder
+
+    with tempfile.TemporaryDirectory() as folder:
+        synthetic_tree(folder, count)
+        seconds = elapsed(sort_folder, folder)
+    return {'sort_folder_seconds': seconds, 'files_per_second': round(count / seconds)}
+
+
+BENCHMARKS = {
+    'memory': memory,
+    'contacts': contacts,
+    'bot': bot_queries,
+    'notes': notes,
+    'pickle': pickle_storage,
+    'mapped': mapped_storage,
+    'sharded': sharded_storage,
+    'sort_folder': folder_sort,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the address book on synthetic data; prints JSON')
+    parser.add_argument('benchmarks', nargs='*', default=list(BENCHMARKS),
+                        help=f'any of {", ".join(BENCHMARKS)} (default: all)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000],
+                        help='numbers of contacts, notes or files to generate (e.g. 1000 100000 1000000)')
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(f'unknown benchmark {name}')
+
+    results = []
+    for name in args.benchmarks:
+        for size in args.sizes:
+            results.append({'benchmark': name, 'size': size, **BENCHMARKS[name](size)})
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,11 @@
 import sys
 import os
-import pickle
+import shlex
+import time
+from collections import deque, defaultdict
+from math import ceil
 from classes import AddressBook, Record, Phone, Birthday, Email, Address
 from notes import Notes
-from prompt_toolkit import prompt
-from prompt_toolkit.completion import WordCompleter
-from folder_sorter import sort_folder
 from abc import ABC, abstractmethod
 
 
@@ -22,13 +22,50 @@ class View(ABC):
     def display_help(self):
         pass
 
+    @abstractmethod
+    def show(self, result, pager=True):
+        pass
+
 
 class ConsoleView(View):
-    def display_contacts(self, data):
-        return data
+    page_size = 20
+    # seconds spent waiting at the pager prompt during the last show()
+    waited = 0.0
+
+    def display_contacts(self, rows):
+        return self.paginate(rows)
     
-    def display_notes(self, data):
-        return data
+    def display_notes(self, rows):
+        return self.paginate(rows)
+
+    def paginate(self, rows):
+        # the first row is the table header, repeated on every page
+        header = next(rows)
+        page = [header]
+        shown = False
+        for row in rows:
+            page.append(row)
+            if len(page) > self.page_size:
+                yield ''.join(page)
+                page = [header]
+                shown = True
+        if len(page) > 1 or not shown:
+            yield ''.join(page)
+
+    def show(self, result, pager=True):
+        if result is None or isinstance(result, str):
+            print(result or '')
+            return
+
+        for number, page in enumerate(result):
+            if number > 0 and pager:
+                started = time.perf_counter()
+                answer = input('-- Enter: next page, q: stop --')
+                self.waited += time.perf_counter() - started
+                if answer.strip().lower() == 'q':
+                    break
+            print(page, end='')
+        print()
 
     def display_help(self):
         commands_help = {
@@ -62,23 +99,39 @@ class ConsoleView(View):
                 <phone>
                 <new phone>''',
             'exit': 'Bot completes its work',
+            'export contacts': '''Bot writes all contacts to a CSV file, or to a vCard file if the name ends with .vcf:
+                <path to file>''',
+            'find duplicates': '''Bot lists the contacts that look like the same person: they share a phone, an email,
+                or a name up to case, punctuation and word order''',
             'find notes by tags': '''Bot searchs the notes by tag:
                 <tag>''',
             'good bye': 'Bot completes its work',
             'hello': 'Greetings in return',
             'help': 'Bot shows the help info',
+            'import contacts': '''Bot adds contacts from a CSV file (name,phones,birthday,email,address; phones separated by ";") or a vCard .vcf file.
+                Rows that fail validation are skipped and listed in <file>.rejected.csv:
+                <path to file>''',
             'link tag': '''Bot attaches a tag to the note:
                 <title>
                 <tag>''',
+            'merge contacts': '''Bot merges contacts into one: their phones are added to it, its empty fields are filled from them,
+                and they are deleted:
+                <name to keep>
+                <names to merge into it, separated by ";">''',
             'phone': '''Bot displays the phone number for the given name:
                 <name>''',
             'remove note': '''Bot removes the note by title:
                 <title>''',
             'show all': 'Bot displays all saved contacts',
             'show notes': 'Bit displays all saved notes',
-            'search notes': '''Bot searchs the notes by title:
-                <title>''',
+            'search notes': '''Bot searchs the notes by words or their beginnings in the title and text:
+                <words>''',
+            'profile': '''Bot runs one command under cProfile and tracemalloc and saves both to files for offline analysis:
+                <command with its arguments>''',
+            'preview sort folder': '''Bot shows which files 'sort folder' would move and which folders it would remove, without changing anything:
+                <path to folder>''',
             'search phone': 'Bot displays the contact at your request',
+            'stats': 'Bot shows how long each command took in this session: p50/p95/max of the computing time and the median time spent waiting for input',
             'sort folder': '''Bot sort the folder by file\'s type (image, documents, music, video, archive, other):
                 <path to folder>''',
             'write note': '''Bot saves the note:
@@ -106,18 +159,56 @@ def input_address():
     address = input('    Input address: ')
     return Address(address)
 
+
+
+def percentile(values, share):
+    # nearest-rank percentile of sorted values
+    return values[max(0, min(len(values) - 1, ceil(share * len(values)) - 1))]
+
+
+class MissingArgument(Exception):
+    # a script line ran out of arguments for a prompt that has no default
+    pass
+
+
+class InvalidArgument(Exception):
+    # a script line gave an argument that does not pass validation
+    pass
+
   
 class Bot():
     _user_interface = ConsoleView()
 
-    def __init__(self) -> None:
+    def __init__(self, storage='pickle', timings=False, started=None, shards=None) -> None:
+        # 'started' is when the process started, for the startup timings
+        self.started = started if started is not None else time.perf_counter()
+        self.timings = timings
         self.contacts_file = 'contacts.bin'
         self.notes_file = 'notes.bin'
-        self.book = AddressBook()
-        self.notes = Notes()
-
-        self.load_file(self.contacts_file, self.book, "AddressBook is created")
-        self.load_file(self.notes_file, self.notes, "New NotesBook is created")
+        self.database_file = 'address_book.db'
+        self.mapped_contacts_file = 'contacts.map'
+        # contacts and notes are read on first use, so commands that need
+        # neither of them do not wait for both files to be loaded
+        self._book = None
+        self._notes = None
+        self.reminded = False
+        self.arguments = None
+        # per command (seconds waiting for input, seconds computing) of recent runs
+        self.latencies = defaultdict(lambda: deque(maxlen=10000))
+        self.waited = 0.0
+        # only the storage in use is imported, with what it needs (sqlite3, mmap)
+        if storage == 'sqlite':
+            from storage import SQLiteStorage
+            self.storage = SQLiteStorage(self.database_file)
+        elif storage == 'mapped':
+            from storage import MappedStorage
+            self.storage = MappedStorage(self.mapped_contacts_file, self.notes_file)
+        elif storage == 'sharded':
+            from storage import ShardedStorage
+            self.storage = ShardedStorage(self.mapped_contacts_file, self.notes_file, shards)
+        else:
+            from storage import PickleStorage
+            self.storage = PickleStorage(self.contacts_file, self.notes_file)
         
         self.commands = {
             'hello': self.greeting,
@@ -128,6 +219,7 @@ class Bot():
             'close': self.exit,
             'exit': self.exit,
             'sort folder': self.folder_sort,
+            'preview sort folder': self.folder_sort_preview,
             'search phone': self.search_phone,
             'delete': self.delete,
             'help': self.help,
@@ -143,21 +235,38 @@ class Bot():
             'edit phone': self.edit_phone,
             'edit birthday': self.edit_birthday,
             'edit email': self.edit_email,
-            'edit address': self.edit_address
+            'edit address': self.edit_address,
+            'import contacts': self.import_contacts,
+            'export contacts': self.export_contacts,
+            'find duplicates': self.find_duplicates,
+            'merge contacts': self.merge_contacts,
+            'stats': self.stats,
+            'profile': self.profile
             }
-        
-        self.completer = self.set_compliter()
 
-    def load_file(self, file_name, entity, message):
-        try:
-            with open(file_name, 'rb') as file:
-                entity.data = pickle.load(file)
-        except:
+    @property
+    def book(self):
+        if self._book is None:
+            self._book = self.load_file('contacts', AddressBook(), "AddressBook is created")
+        return self._book
+
+    @property
+    def notes(self):
+        if self._notes is None:
+            self._notes = self.load_file('notes', Notes(), "New NotesBook is created")
+        return self._notes
+
+    def load_file(self, kind, entity, message):
+        started = time.perf_counter()
+        if not self.storage.load(kind, entity):
             print(message)
+        self.timing(f'load {kind}', started)
+        return entity
 
-    def write_to_file(self, file_name, entity):
-        with open(file_name, 'wb') as f:
-            pickle.dump(entity.data, f)
+    def timing(self, label, started, finished=None):
+        if self.timings:
+            finished = finished if finished is not None else time.perf_counter()
+            print(f'[timings] {label}: {(finished - started) * 1000:.1f} ms', file=sys.stderr)
 
     @staticmethod
     def input_error(func):
@@ -172,76 +281,100 @@ class Bot():
                 return 'Please input command and name'
         return inner
 
+    def ask(self, text, default=None):
+        # interactive sessions prompt the user; scripts take the next inline argument
+        if self.arguments is None:
+            started = time.perf_counter()
+            answer = input(text)
+            self.waited += time.perf_counter() - started
+            return answer
+        if self.arguments:
+            return self.arguments.popleft()
+        if default is not None:
+            return default
+        raise MissingArgument(text.strip())
+
+    def reject(self, message):
+        # interactive sessions explain and prompt again; a script line fails as a whole
+        if self.arguments is not None:
+            raise InvalidArgument(message.strip())
+        print(message)
+
     def greeting(self):
         return "How can I help you?"
 
     def get_record(self, name):
-        for record in self.book.data.values():
-            if record.name.value == name:
-                return record
-        
-        return None
+        return self.book.data.get(name)
     
     @input_error
     def get_record_by_name_input(self):
-        name = input('\tEnter contact name: ').rstrip().lstrip()
+        name = self.ask('\tEnter contact name: ').rstrip().lstrip()
         record_to_change = self.get_record(name)
+        suggestions = []
         while record_to_change == None:
-            print(f'There is no such contact with name {name}')
-            name = input('\tEnter contact name: ').rstrip().lstrip()
+            if name.isdigit() and 0 < int(name) <= len(suggestions):
+                # the number of one of the names suggested last time
+                record_to_change = self.get_record(suggestions[int(name) - 1])
+                break
+
+            self.reject(f'There is no such contact with name {name}')
+            suggestions = self.book.suggest(name)
+            if suggestions:
+                print('\tDid you mean: ' + ', '.join(f'{number}. {suggestion}' for number, suggestion in enumerate(suggestions, 1)))
+            name = self.ask('\tEnter contact name or the number of a suggestion: ').rstrip().lstrip()
             record_to_change = self.get_record(name)
         
         return record_to_change
     
     @input_error
     def name_input(self):
-        return input('\tEnter name: ')
+        return self.ask('\tEnter name: ')
 
     @input_error
     def phone_input(self, text_for_user=None):
         text = '\t' + (text_for_user if text_for_user != None else '') + 'Enter phone: '
-        phone_input = input(text)
+        phone_input = self.ask(text)
             
         while True:
             try:
                 phone = Phone(phone_input)
                 break
             except ValueError:
-                print('\tInvalid phone number format! Phone must contain 10 digits.')
-                phone_input = input('\tEnter phone: ')
+                self.reject('\tInvalid phone number format! Phone must contain 10 digits.')
+                phone_input = self.ask('\tEnter phone: ')
         return phone
     
     @input_error
     def birhtday_input(self):
-        birthday_input = input('\tEnter date of birthday (DD.MM.YYYY) or pass: ')
+        birthday_input = self.ask('\tEnter date of birthday (DD.MM.YYYY) or pass: ', 'pass')
         birthday = 'Not set'
         while birthday_input not in ('pass', ''):
             try:
                 birthday = Birthday(birthday_input)
                 break
             except ValueError:
-                print('\tIncorrect birthday format, try again with DD.MM.YYYY')
-                birthday_input = input('\tEnter date of birthday (DD.MM.YYYY) or pass: ')
+                self.reject('\tIncorrect birthday format, try again with DD.MM.YYYY')
+                birthday_input = self.ask('\tEnter date of birthday (DD.MM.YYYY) or pass: ', 'pass')
         
         return birthday
     
     @input_error
     def email_input(self):
-        email_input = input('\tEnter email or pass: ')
+        email_input = self.ask('\tEnter email or pass: ', 'pass')
         email = 'Not set'
         while email_input not in ('pass', ''):
             try:
                 email = Email(email_input)
                 break
             except ValueError:
-                print('\tIncorrect email format, try again in format name@test.com')
-                email_input = input('\tEnter or pass: ')
+                self.reject('\tIncorrect email format, try again in format name@test.com')
+                email_input = self.ask('\tEnter or pass: ', 'pass')
         
         return email
 
     @input_error
     def address_input(self):
-        address = input('\tEnter address or pass: ')
+        address = self.ask('\tEnter address or pass: ', 'pass')
         if address in ('pass', ''):
             address = 'Not set'
         
@@ -262,10 +395,10 @@ class Bot():
     def show_all(self):
         if not self.book.data:
             return 'You have no any contacts saved'
-        return Bot._user_interface.display_contacts(self.book.get_records())
+        return Bot._user_interface.display_contacts(self.book.rows())
 
     def show_notes(self) -> str:
-        return Bot._user_interface.display_notes(self.notes.get_notes())
+        return Bot._user_interface.display_notes(self.notes.rows())
     
     def help(self):
         return Bot._user_interface.display_help()
@@ -284,7 +417,9 @@ class Bot():
     def edit_birthday(self):
         record_to_change = self.get_record_by_name_input()
         birthday = self.birhtday_input()
-        record_to_change.change_birthday(str(birthday))
+        if birthday == 'Not set':
+            return 'Birthday was not changed'
+        record_to_change.change_birthday(birthday)
         self.book.add_record(record_to_change)
         return 'Contact updated!'
             
@@ -292,7 +427,9 @@ class Bot():
     def edit_email(self):
         record_to_change = self.get_record_by_name_input()
         email = self.email_input()
-        record_to_change.change_email(str(email))
+        if email == 'Not set':
+            return 'Email was not changed'
+        record_to_change.change_email(email)
         self.book.add_record(record_to_change)
         return 'Contact updated!'
           
@@ -312,47 +449,109 @@ class Bot():
     @input_error
     def phone(self):
         name = self.name_input()
-        return '\t' + self.book.find(name).get_phones()
+        record = self.book.find(name)
+        if not isinstance(record, Record):
+            return record
+        return '\t' + record.get_phones()
 
     @input_error
     def write_note(self):
-        title = input('Please, enter the title: ')
-        text = input('Please, enter the text. You can leave this field empty: ')
+        title = self.ask('Please, enter the title: ')
+        text = self.ask('Please, enter the text. You can leave this field empty: ', '')
         return self.notes.add_note(title, text)
     
     @input_error
     def remove_note(self):
-        note_to_remove = input('Please, enter the title of the note: ')
+        note_to_remove = self.ask('Please, enter the title of the note: ')
         return self.notes.delete_note(note_to_remove)
     
     @input_error
     def edit_note(self):
-        note_to_edit = input('Please, enter the title of the note: ')
-        text = input('Please, enter the new text for the note: ')
+        note_to_edit = self.ask('Please, enter the title of the note: ')
+        text = self.ask('Please, enter the new text for the note: ')
 
         return self.notes.edit_note(note_to_edit, text)
              
     def exit(self):
-        if len(self.book.data) > 0:
-            self.write_to_file(self.contacts_file, self.book)
-
-        if len(self.notes.data) > 0:
-            self.write_to_file(self.notes_file, self.notes)
-
+        self.storage.close()
         print('Good Bye')
         sys.exit()
 
+    @input_error
     def search_phone(self):
-        phone_to_search = self.phone_input()
-        result = []
-        for record in self.book.data.values():
-            if phone_to_search in record.name.value + ' '.join([phone.value for phone in record.phones]):
-                result.append(str(record))
-        return result
+        phone_to_search = self.ask('\tEnter phone or its part: ').strip()
+        if not phone_to_search.isdigit():
+            return 'Phone can contain digits only'
+
+        result = [str(record) for record in self.book.search_phone(phone_to_search)]
+        if not result:
+            return f'There is no contacts with phone {phone_to_search}'
+        return '\n'.join(result)
     
+    @input_error
+    def import_contacts(self):
+        import csv
+        from exchange import FIELDS
+        path = self.ask('Please, enter the path to a .csv or .vcf file: ').strip()
+        if not os.path.isfile(path):
+            return 'file not found'
+
+        report_path = path + '.rejected.csv'
+        with open(report_path, 'w', newline='', encoding='utf-8') as report:
+            writer = csv.writer(report)
+            writer.writerow(('line', 'reason', *FIELDS))
+
+            def rejected(line, fields, reason):
+                writer.writerow((line, reason, *(fields[field] for field in FIELDS)))
+
+            imported, skipped = self.book.import_contacts(path, rejected)
+
+        if not skipped:
+            os.remove(report_path)
+            return f'{imported} contacts imported'
+        return f'{imported} contacts imported, {skipped} rows rejected, see {report_path}'
+
+    @input_error
+    def export_contacts(self):
+        path = self.ask('Please, enter the path to a .csv or .vcf file: ').strip()
+        try:
+            count = self.book.export_contacts(path)
+        except OSError as error:
+            return f'Could not write {path}: {error.strerror}'
+        return f'{count} contacts exported to {path}'
+
+    def find_duplicates(self):
+        clusters = self.book.duplicates()
+        if not clusters:
+            return 'There are no duplicate contacts'
+
+        def rows():
+            yield f'{len(clusters)} groups of contacts that look like the same person (merge them with \'merge contacts\'):\n'
+            for number, (names, keys) in enumerate(clusters, 1):
+                yield f"{number}. {' | '.join(names)}  (same {', '.join(sorted(keys))})\n"
+        return Bot._user_interface.display_contacts(rows())
+
+    @input_error
+    def merge_contacts(self):
+        target = self.get_record_by_name_input()
+        others = []
+        for name in self.ask('\tEnter the contacts to merge into it, separated by ";": ').split(';'):
+            name = name.strip()
+            if not name or name == target.name.value:
+                continue
+            record = self.get_record(name)
+            if record is None:
+                return f'There is no such contact with name {name}'
+            others.append(record)
+        if not others:
+            return 'Nothing to merge'
+
+        self.book.merge(target, others)
+        return f'{len(others)} contacts merged into {target.name.value}\n{target}'
+
     @input_error
     def search_notes_by_tags(self):
-        tag_name = input('Please, enter the tag name: ')
+        tag_name = self.ask('Please, enter the tag name: ')
         tag_id = self.notes.get_tag_id(tag_name)
         if tag_id == None:
             return f"There is no such tag {tag_name}"
@@ -360,29 +559,36 @@ class Bot():
         return self.notes.find_notes_by_tag(tag_id=tag_id)
     
     def folder_sort(self):
-        target_folder_path = input('Please, enter the path to folder: ')
+        target_folder_path = self.ask('Please, enter the path to folder: ')
         if not os.path.exists(target_folder_path):
             return 'folder not found'
     
-        return sort_folder(target_folder_path, display_analytics=True)
+        from folder_sorter import sort_folder, Classifier, DEFAULT_WORKERS
+
+        sort_folder(target_folder_path, display_analytics=True, workers=DEFAULT_WORKERS,
+                    classifier=Classifier.from_rules_file())
+
+    def folder_sort_preview(self):
+        target_folder_path = self.ask('Please, enter the path to folder: ')
+        if not os.path.exists(target_folder_path):
+            return 'folder not found'
+
+        from folder_sorter import sort_folder, Classifier
+
+        sort_folder(target_folder_path, dry_run=True, classifier=Classifier.from_rules_file())
 
     @input_error
     def birthday(self, days=None):
         birthday_man = str()
         if days == None:
-            days_depth = int(input('Please, enter the depth in days: '))
+            days_depth = int(self.ask('Please, enter the depth in days: '))
         else:
             days_depth = days
         
         days_depth = days_depth if days_depth != None else 7
 
-        for record in self.book.data.values():
-            try:
-                if record.birthday.value:
-                    if record.days_to_birthday(record.birthday) < days_depth:
-                        birthday_man += '{:^15} {:^15}\n'.format(record.name.value, record.birthday.value)
-            except AttributeError:
-                continue
+        for record in self.book.birthdays(days_depth):
+            birthday_man += '{:^15} {:^15}\n'.format(record.name.value, str(record.birthday))
         
         if len(birthday_man) == 0 and days != None:
             return str()
@@ -396,21 +602,26 @@ class Bot():
 
     @input_error
     def search_notes(self) -> str:
-        note_to_search = input('Please, enter the title of the note: ').strip().lower()
-        return self.notes.find_notes(note_to_search).get_notes()
+        note_to_search = self.ask('Please, enter the words to search for: ').strip().lower()
+        notes_found = self.notes.find_notes(note_to_search)
+        if not notes_found:
+            return f"There is no notes matching '{note_to_search}'"
+        return self.notes.get_notes(notes_found)
 
     @input_error
     def create_tag(self) -> str:
-        tag = input('Please, enter the title of the tag: ').strip()
+        tag = self.ask('Please, enter the title of the tag: ').strip()
         return self.notes.tags.add_tag(tag)
     
     @input_error
     def link_tag(self) -> str:
-        note_title = input('Please, input the title of note you want to add: ')
-        tag_name = input('Please, input the name of tag you want to add: ')
+        note_title = self.ask('Please, input the title of note you want to add: ')
+        tag_name = self.ask('Please, input the name of tag you want to add: ')
         return self.notes.add_tag_for_note(tag_name, note_title)
 
     def set_compliter(self):
+        from prompt_toolkit.completion import WordCompleter
+
         function_names = list()
         for command in self.commands.keys():
             function_names.append(command)
@@ -423,15 +634,163 @@ class Bot():
         user_command = user_input.lower().rstrip().lstrip()
         return self.commands.get(user_command)
 
+    def parse_command(self, words):
+        # the longest command the words start with, so 'sort folder' and
+        # 'preview sort folder' or 'search phone' and 'phone' never clash
+        longest = max(len(command.split()) for command in self.commands)
+        for length in range(min(len(words), longest), 0, -1):
+            command = ' '.join(words[:length]).lower()
+            if command in self.commands:
+                return command, words[length:]
+        return None, words
+
+    def execute(self, command, pager=True, waited=0.0):
+        # Runs a command and shows its result, recording how much of the time
+        # went to waiting for the user and how much to the command itself.
+        # Paged results are computed while they are shown, so show() is timed too.
+        self.waited = waited
+        view = Bot._user_interface
+        view.waited = 0.0
+        started = time.perf_counter()
+        try:
+            result = self.commands[command]()
+            view.show(result, pager)
+        finally:
+            total = time.perf_counter() - started + waited
+            waited = self.waited + view.waited
+            self.latencies[command].append((waited, total - waited))
+
+    def stats(self):
+        if not self.latencies:
+            return 'No commands were run yet'
+
+        table = '|{:^20}|{:^7}|{:^10}|{:^10}|{:^10}|{:^12}|\n'.format('Command', 'Runs', 'p50, ms', 'p95, ms', 'max, ms', 'input, ms')
+        for command, samples in sorted(self.latencies.items()):
+            computing = sorted(seconds for _, seconds in samples)
+            waiting = sorted(seconds for seconds, _ in samples)
+            table += '|{:^20}|{:^7}|{:^10.1f}|{:^10.1f}|{:^10.1f}|{:^12.1f}|\n'.format(
+                command, len(samples), percentile(computing, 0.5) * 1000, percentile(computing, 0.95) * 1000,
+                computing[-1] * 1000, percentile(waiting, 0.5) * 1000)
+        return table
+
+    def profile(self):
+        # The profiled command takes its arguments from the same line if they
+        # are given there, and prompts for them otherwise.
+        import cProfile
+        import tracemalloc
+
+        line = self.ask('Please, enter the command to profile: ') if self.arguments is None else ''
+        try:
+            words = list(self.arguments) if self.arguments is not None else shlex.split(line)
+        except ValueError as error:
+            return str(error)
+        command, arguments = self.parse_command(words)
+        if command is None or command == 'profile':
+            return f"Unknown command {' '.join(words)}"
+
+        interactive = self.arguments is None
+        self.arguments = deque(arguments) if arguments or not interactive else None
+        name = f"profile-{command.replace(' ', '-')}-{time.strftime('%Y%m%d-%H%M%S')}"
+        # the profiled command keeps its own waits; this one's are put back afterwards
+        view = Bot._user_interface
+        waited, view_waited = self.waited, view.waited
+        profiler = cProfile.Profile()
+        tracemalloc.start()
+        profiler.enable()
+        try:
+            self.execute(command, pager=interactive)
+        except MissingArgument as error:
+            print(f"missing argument for '{error}'")
+        except InvalidArgument as error:
+            print(error)
+        finally:
+            profiler.disable()
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            if interactive:
+                self.arguments = None
+            self.waited, view.waited = waited, view_waited
+
+        profiler.dump_stats(name + '.prof')
+        snapshot.dump(name + '.tracemalloc')
+        return (f'Profile saved to {name}.prof (open with python -m pstats), memory snapshot to {name}.tracemalloc '
+                f'(tracemalloc.Snapshot.load); peak memory {peak / 1024:.0f} KiB')
+
+    def run_line(self, line, prefix=''):
+        # runs one command given with its arguments inline and returns the
+        # command, or None if the line was not one or failed on its arguments
+        try:
+            words = shlex.split(line)
+        except ValueError as error:
+            print(f'{prefix}{error}')
+            return None
+
+        command, arguments = self.parse_command(words)
+        if command is None:
+            print(f'{prefix}unknown command {line}')
+            return None
+
+        self.arguments = deque(arguments)
+        try:
+            self.execute(command, pager=False)
+        except MissingArgument as error:
+            print(f"{prefix}missing argument for '{error}'")
+            return None
+        except InvalidArgument as error:
+            print(f'{prefix}{error}')
+            # the rest of the line belonged to the failed command
+            self.arguments = None
+            return None
+        finally:
+            if self.arguments:
+                print(f"{prefix}ignored arguments {' '.join(self.arguments)}")
+            self.arguments = None
+        return command
+
+    def run_script(self, lines, commit_every=0):
+        # One command per line with its arguments inline, quoted where they
+        # contain spaces: add "John Smith" 0123456789 01.01.1990 pass "Main st 1"
+        # Optional arguments left out at the end of a line are skipped.
+        done = 0
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if self.run_line(line, f'line {number}: ') is None:
+                continue
+
+            done += 1
+            if commit_every and done % commit_every == 0:
+                self.storage.commit()
+
+        self.storage.close()
+        self.timing('script', self.started)
+
+    def remind_birthdays(self):
+        # shown once, as soon as the contacts are at hand
+        self.reminded = True
+        print(self.birthday(30))
+
     def run(self):
+        from prompt_toolkit import prompt
+
+        self.completer = self.set_compliter()
         print('Hello!')
-        print(self.birthday(30))
+        if self.storage.indexed:
+            # answered by the database without reading the contacts in
+            self.remind_birthdays()
+        self.timing('ready for input', self.started)
 
         while True:
+            started = time.perf_counter()
             user_input = prompt('>> ', completer=self.completer)
-            handler = self.get_handler(user_input)
-            if handler == None:
+            waited = time.perf_counter() - started
+            command = user_input.lower().strip()
+            if command not in self.commands:
                 print('Unknown command! Please, enter command from the list below:\n')
-                handler = self.get_handler('help') 
-            result = handler()
-            print(result or '')
\ No newline at end of file
+                command = 'help'
+            self.execute(command, waited=waited)
+            self.storage.commit()
+            if not self.reminded and self._book is not None:
+                self.remind_birthdays()
\ No newline at end of file
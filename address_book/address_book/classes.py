@@ -1,8 +1,28 @@
 from collections import UserDict
-from datetime import datetime, date
+import gc
+from datetime import date
+from itertools import islice
 import re
+from indexes import PhoneIndex, NameIndex, BirthdayIndex, birthday_in_year
+from dedup import find_duplicates
+
+BIRTHDAY_PATTERN = re.compile(r'(\d{1,2})\.(\d{1,2})\.(\d{4})')
+EMAIL_PATTERN = re.compile(r'([a-zA-Z]{1}[a-zA-Z0-9._]{1,}@[a-zA-Z]+\.[a-zA-Z]{2,})')
+
+
+def parse_birthday(value):
+    # same format as '%d.%m.%Y' without going through strptime
+    match = BIRTHDAY_PATTERN.fullmatch(value)
+    if match is None:
+        raise ValueError(f'Birthday {value} does not match DD.MM.YYYY')
+    day, month, year = match.groups()
+    return date(int(year), int(month), int(day))
+
 
 class Field:
+    # slots instead of a __dict__ per field; a large address book holds millions of them
+    __slots__ = ('__value',)
+
     def __init__(self, value):
         if not self.is_valid(value):
             raise ValueError
@@ -23,34 +43,62 @@ class Field:
     
     def is_valid(self, value):
         return True
+
+    def __eq__(self, other):
+        return type(other) == type(self) and self.__value == other.value
+
+    def __hash__(self):
+        return hash((type(self).__name__, self.__value))
+
+    def __getstate__(self):
+        return self.__value
+
+    def __setstate__(self, state):
+        # objects pickled before fields had slots carry their state as a dict
+        if isinstance(state, dict):
+            state = state['_Field__value']
+        self.__value = state
     
 
 class Name(Field):
     # реалізація класу
-    pass
+    __slots__ = ()
 
 
 class Phone(Field):
     # реалізація класу
+    __slots__ = ()
+
     def is_valid(self, value):
-        return value.isdigit() and len(value) == 10
-    
-    def __eq__(self, phone):
-        if type(phone) != Phone:
-            return False
-        return self.value == phone.value
+        return len(value) == 10 and value.isascii() and value.isdigit()
     
 class Address(Field):
+    __slots__ = ()
+
     def __str__(self):
         return str(self.value)
 
 class Birthday(Field):
+    # the parsed date is kept next to the string, which is only used for display
+    __slots__ = ('date',)
+
     def is_valid(self, value):
         try:
-            datetime.strptime(value, '%d.%m.%Y')
+            self.date = parse_birthday(value)
             return True
-        except ValueError:
+        except (ValueError, TypeError):
             return False
+
+    def __getstate__(self):
+        return self.value, self.date
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            super().__setstate__(state[0])
+            self.date = state[1]
+        else:
+            super().__setstate__(state)
+            self.date = parse_birthday(self.value)
     
     def __str__(self):
         return str(self.value)
@@ -60,38 +108,43 @@ class Birthday(Field):
 
 
 class Email(Field):
+    __slots__ = ()
+
     def is_valid(self, value):
         if value:
-            return re.fullmatch(r'([a-zA-Z]{1}[a-zA-Z0-9._]{1,}@[a-zA-Z]+\.[a-zA-Z]{2,})', value)
+            return EMAIL_PATTERN.fullmatch(value)
         return False
             
         
 
 class Record:
     # реалізація класу
+    __slots__ = ('name', 'phones', 'birthday', 'email', 'address', 'book')
+
     def __init__(self, name, phone=None, birthday=None, email=None, address=None):
+        self.book = None
         self.name = Name(name)
         self.phones = list()
-        if type(phone) == str():
+        if type(phone) == str:
             self.phones.append(Phone(phone))
         elif type(phone) == Phone:
             self.phones.append(phone)
         
-        if type(birthday) == str():
+        if type(birthday) == str and birthday != 'Not set':
             self.birthday = Birthday(birthday)
         elif type(birthday) == Birthday:
             self.birthday = birthday
         else:
             self.birthday = 'Not set'
         
-        if type(email) == str():
+        if type(email) == str and email != 'Not set':
             self.email = Email(email)
         elif type(email) == Email:
             self.email = email
         else:
             self.email = 'Not set'
 
-        if type(address) == str:
+        if type(address) == str and address != 'Not set':
             self.address = Address(address)
         elif type(address) == Address:
             self.address = address
@@ -102,11 +155,13 @@ class Record:
         phone = Phone(phone)
         if phone not in self.phones:
             self.phones.append(phone)
+            self.changed()
 
     def remove_phone(self, phone: str):
         for i in self.phones:
             if i.value == phone:
                 self.phones.remove(i)
+                self.changed()
 
     def change_phone(self, phone:str=None, new_phone:str=None, phone_obj:Phone=None, new_phone_obj:Phone=None):
         if phone != None and new_phone != None:
@@ -121,16 +176,21 @@ class Record:
             self.phones[index] = new_phone
         except ValueError:
             return 'Contacts has no such phone'
-        
+
+        self.changed()
         return "Phone '{phone.value}' was successfuly changed to '{new_phone.value}'"
     
     def change_birthday(self, birthday):
-        birthday = Birthday(birthday)
-        self.birthday = str(birthday)
+        if type(birthday) != Birthday:
+            birthday = Birthday(birthday)
+        self.birthday = birthday
+        self.changed()
     
     def change_email(self, email):
-        email = Email(email)
-        self.email = str(email)
+        if type(email) != Email:
+            email = Email(email)
+        self.email = email
+        self.changed()
 
     def change_address(self, address):
         if type(address) != Address:
@@ -139,6 +199,11 @@ class Record:
             self.address = address
         else:
             raise AttributeError("Unknown type of address in 'change_address'")
+        self.changed()
+
+    def changed(self):
+        if self.book is not None:
+            self.book.record_changed(self)
                 
     def find_phone(self, phone: str):
         for i in self.phones:
@@ -147,13 +212,13 @@ class Record:
         return None
     
     def days_to_birthday(self, birthday):
-        if self.birthday:
+        if type(self.birthday) == Birthday:
             today = date.today()
-            next_birthday = datetime.strptime(str(self.birthday), '%d.%m.%Y')
-            birthday_day = date(year=today.year, month=next_birthday.month, day=next_birthday.day)
+            next_birthday = self.birthday.date
+            birthday_day = birthday_in_year(next_birthday.month, next_birthday.day, today.year)
 
             if today > birthday_day:
-                birthday_day = date(year=today.year + 1, month=next_birthday.month, day=next_birthday.day)
+                birthday_day = birthday_in_year(next_birthday.month, next_birthday.day, today.year + 1)
 
             days = birthday_day - today
             return days.days
@@ -165,6 +230,41 @@ class Record:
         else:
             return 'Contact has no phones'
 
+    @classmethod
+    def from_fields(cls, fields):
+        # builds a record from imported strings; the ValueError says what was wrong
+        from exchange import split_phones
+        if not fields['name']:
+            raise ValueError('name is missing')
+        record = cls(fields['name'])
+        for phone in split_phones(fields['phones']):
+            try:
+                record.phones.append(Phone(phone))
+            except ValueError:
+                raise ValueError(f'invalid phone {phone}') from None
+        if fields['birthday']:
+            try:
+                record.birthday = Birthday(fields['birthday'])
+            except ValueError:
+                raise ValueError(f"invalid birthday {fields['birthday']}") from None
+        if fields['email']:
+            try:
+                record.email = Email(fields['email'])
+            except ValueError:
+                raise ValueError(f"invalid email {fields['email']}") from None
+        if fields['address']:
+            record.address = Address(fields['address'])
+        return record
+
+    def to_fields(self):
+        return {
+            'name': self.name.value,
+            'phones': ';'.join(phone.value for phone in self.phones),
+            'birthday': '' if self.birthday == 'Not set' else str(self.birthday),
+            'email': '' if self.email == 'Not set' else str(self.email),
+            'address': '' if self.address == 'Not set' else str(self.address),
+        }
+
     def __str__(self):
         return f"Contact name: {self.name.value}, phones: {'; '.join(p.value for p in self.phones)}, birthday: {self.birthday}, email: {self.email}, address: {self.address}"
     
@@ -173,39 +273,253 @@ class Record:
             return False
         return self.name == record.name
 
+    def __getstate__(self):
+        return self.name, self.phones, self.birthday, self.email, self.address
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            state = state['name'], state['phones'], state['birthday'], state['email'], state['address']
+        self.name, self.phones, self.birthday, self.email, self.address = state
+        self.book = None
+        # change_birthday and change_email used to store plain strings
+        if type(self.birthday) == str and self.birthday != 'Not set':
+            self.birthday = Birthday(self.birthday)
+        if type(self.email) == str and self.email != 'Not set':
+            self.email = Email(self.email)
+        # contacts added without an address used to get Address('Not set')
+        if type(self.address) == Address and self.address.value == 'Not set':
+            self.address = 'Not set'
+
 class AddressBook(UserDict):
     # реалізація класу
+    storage = None
+    # set by every logged change, cleared by the storage once it has a snapshot with it
+    dirty = False
+    _phone_index = None
+    _name_index = None
+    _birthday_index = None
+
     def add_record(self, record):
         if record.name.value in self.data:
             return self.data[record.name.value]
         self.data[record.name.value] = record
+        record.book = self
+        self.index(record)
+        self.log('put', record)
         return record
 
+    def add_records(self, records):
+        # one journal entry for the whole batch; records that already exist are the caller's business
+        for record in records:
+            record.book = self
+            if not self.indexed:
+                # SQLite gets the records through the journal entry; caching them
+                # here would keep a whole import in memory
+                self.data[record.name.value] = record
+            self.index(record)
+        self.log('put_many', records)
+        return len(records)
+
+    def import_contacts(self, path, rejected=None, batch_size=1000):
+        # Streams a CSV or vCard file into the book. Rows that do not pass
+        # validation are skipped and handed to 'rejected(line, fields, reason)'.
+        from exchange import READERS, format_of
+        imported = skipped = 0
+        batch, names = [], set()
+        # the records are all long lived, so cyclic collections during the
+        # import would only walk the growing book again and again
+        collect = gc.isenabled()
+        gc.disable()
+        try:
+            with open(path, newline='', encoding='utf-8') as file:
+                for line, fields in READERS[format_of(path)](file):
+                    try:
+                        record = Record.from_fields(fields)
+                        if record.name.value in names or record.name.value in self.data:
+                            raise ValueError(f'contact {record.name.value} already exists')
+                    except ValueError as error:
+                        skipped += 1
+                        if rejected is not None:
+                            rejected(line, fields, str(error))
+                        continue
+
+                    batch.append(record)
+                    names.add(record.name.value)
+                    if len(batch) == batch_size:
+                        imported += self.add_records(batch)
+                        batch, names = [], set()
+
+            if batch:
+                imported += self.add_records(batch)
+        finally:
+            if collect:
+                gc.enable()
+        return imported, skipped
+
+    def export_contacts(self, path):
+        from exchange import WRITERS, format_of
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            return WRITERS[format_of(path)](file, (record.to_fields() for record in self.data.values()))
+
+    def duplicates(self):
+        return find_duplicates(self.data.values())
+
+    def merge(self, target, others):
+        # phones are pooled; a field 'target' has not set is taken from the first of 'others' that has it
+        for other in others:
+            for phone in other.phones:
+                if phone not in target.phones:
+                    target.phones.append(phone)
+            if target.birthday == 'Not set':
+                target.birthday = other.birthday
+            if target.email == 'Not set':
+                target.email = other.email
+            if target.address == 'Not set':
+                target.address = other.address
+            self.delete(other)
+        target.changed()
+        return target
+
+    def record_changed(self, record):
+        self.index(record)
+        self.log('put', record)
+
+    @property
+    def phone_index(self):
+        if self._phone_index is None:
+            self._phone_index = PhoneIndex(self.data.values())
+        return self._phone_index
+
+    @property
+    def name_index(self):
+        if self._name_index is None:
+            self._name_index = NameIndex(self.data)
+        return self._name_index
+
+    @property
+    def birthday_index(self):
+        if self._birthday_index is None:
+            self._birthday_index = BirthdayIndex(self.data.values())
+        return self._birthday_index
+
+    def index(self, record):
+        if self._phone_index is not None:
+            self._phone_index.update(record)
+        if self._name_index is not None:
+            self._name_index.add(record.name.value)
+        if self._birthday_index is not None:
+            self._birthday_index.update(record)
+
+    def unindex(self, name):
+        if self._phone_index is not None:
+            self._phone_index.remove(name)
+        if self._name_index is not None:
+            self._name_index.remove(name)
+        if self._birthday_index is not None:
+            self._birthday_index.remove(name)
+
+    def drop_indexes(self):
+        self._phone_index = None
+        self._name_index = None
+        self._birthday_index = None
+
+    def log(self, op, *args):
+        if self.storage is not None:
+            self.storage.log('contacts', op, *args)
+        self.dirty = True
+
+    def dump(self):
+        # a copy, so that it can be pickled while the book keeps changing
+        return dict(self.data)
+
+    def restore(self, data):
+        self.data = data
+        self.drop_indexes()
+        for record in data.values():
+            record.book = self
+
+    def apply(self, op, *args):
+        self.drop_indexes()
+        if op == 'put':
+            record = args[0]
+            record.book = self
+            self.data[record.name.value] = record
+        elif op == 'put_many':
+            for record in args[0]:
+                record.book = self
+                self.data[record.name.value] = record
+        elif op == 'delete':
+            self.data.pop(args[0], None)
+
+    @property
+    def indexed(self):
+        return self.storage is not None and self.storage.indexed
+
     def find(self, name):
-        for record in self.data.values():
-            if name in record.name.value:
-                return record
+        for page in self.find_all(name, 1):
+            return page[0]
         return f"There is no contacts with name '{name}'"
 
+    def find_all(self, name, page_size=10):
+        if self.indexed:
+            records = self.storage.find_contacts(name)
+        else:
+            records = (self.data[found] for found in self.name_index.search(name))
+
+        page = []
+        for record in records:
+            page.append(record)
+            if len(page) == page_size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def suggest(self, name, limit=5):
+        # names a mistyped one was probably meant to be
+        if self.indexed:
+            return self.storage.suggest(name, limit)
+        return self.name_index.similar(name, limit)
+
+    def search_phone(self, digits):
+        if self.indexed:
+            return self.storage.search_phone(digits)
+
+        return [self.data[name] for name in sorted(self.phone_index.search(digits))]
+
+    def birthdays(self, days):
+        if self.indexed:
+            return self.storage.birthdays(days)
+
+        return [self.data[name] for name in self.birthday_index.upcoming(date.today(), days)]
+
     def delete(self, record):
         try:
             del self.data[record.name.value]
         except KeyError:
             print('Contact not found')
+        else:
+            record.book = None
+            self.unindex(record.name.value)
+            self.log('delete', record.name.value)
         
         return 'Contact was successfully deleted!'
 
     def iterator(self, n=1):
-        records = list(self.data.values())
-        for i in range(0, len(records), n):
-            yield records[i: i+n]
+        records = iter(self.data.values())
+        page = list(islice(records, n))
+        while page:
+            yield page
+            page = list(islice(records, n))
 
-    def get_records(self):
-        records = '|{:^10}|{:^20}|{:^15}|{:^15}|{:^20}\n'.format("Name", "Phones", "Birthday", "Email", "Address")
+    def rows(self):
+        yield '|{:^10}|{:^20}|{:^15}|{:^15}|{:^20}\n'.format("Name", "Phones", "Birthday", "Email", "Address")
         for record in self.data.values():
-            records += '|{:^10}|{:^20}|{:^15}|{:^15}|{:^20}\n'.format(record.name.value,\
+            yield '|{:^10}|{:^20}|{:^15}|{:^15}|{:^20}\n'.format(record.name.value,\
                 ', '.join(p.value for p in record.phones), str(record.birthday), str(record.email), str(record.address))
-        return records
+
+    def get_records(self):
+        return ''.join(self.rows())
 
     def __str__(self) -> str:
         return '\n'.join(str(r) for r in self.data.values())
@@ -0,0 +1,58 @@
+import argparse
+import socket
+import sys
+
+# same as server.DEFAULT_PORT; not imported from there so that the client
+# does not load the whole bot
+DEFAULT_PORT = 8765
+EXIT_COMMANDS = ('exit', 'close', 'good bye')
+
+
+def connect(host, port, unix_path):
+    if unix_path is not None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(unix_path)
+        return connection
+    return socket.create_connection((host, port))
+
+
+def receive(stream):
+    header = stream.readline()
+    if not header:
+        return None
+    return stream.read(int(header)).decode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='address-book-client',
+                                     description='Talk to an address book server; commands take their arguments inline')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', metavar='PATH', help='connect to a Unix socket instead of TCP')
+    args = parser.parse_args()
+
+    interactive = sys.stdin.isatty()
+    with connect(args.host, args.port, args.unix) as connection:
+        stream = connection.makefile('rb')
+        print(receive(stream), end='')
+        while True:
+            try:
+                line = input('>> ') if interactive else sys.stdin.readline()
+            except EOFError:
+                break
+            if not interactive and not line:
+                break
+            if not line.strip():
+                continue
+
+            connection.sendall(line.strip().encode('utf-8') + b'\n')
+            reply = receive(stream)
+            if reply is None:
+                break
+            print(reply, end='' if reply.endswith('\n') else '\n')
+            if line.strip().lower() in EXIT_COMMANDS:
+                break
+
+
+if __name__ == '__main__':
+    main()
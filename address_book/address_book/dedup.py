@@ -0,0 +1,78 @@
+import re
+from collections import defaultdict
+
+# Two contacts are taken for the same person when they share a phone, an
+# email or a name that differs only in case, punctuation or word order.
+# Every contact is filed under those keys in one pass, contacts sharing a key
+# are joined with union-find, and the joined groups are the duplicate
+# clusters, so the work grows with the number of contacts, not with its square.
+
+NAME_SEPARATORS = re.compile(r'[\W_]+')
+
+
+def name_key(name):
+    # 'Smith, John' and 'john  smith' -> 'john smith'
+    return ' '.join(sorted(NAME_SEPARATORS.sub(' ', name).casefold().split()))
+
+
+def email_key(email):
+    return str(email).strip().lower()
+
+
+def keys_of(record):
+    # 'kind:key' strings rather than tuples; there are a few per contact in a large book
+    yield 'name:' + name_key(record.name.value)
+    for phone in record.phones:
+        # phones are validated to 10 digits, so they are their own key
+        yield 'phone:' + phone.value
+    if record.email != 'Not set':
+        yield 'email:' + email_key(record.email)
+
+
+class UnionFind:
+    def __init__(self):
+        self.parents = {}
+        self.sizes = {}
+
+    def find(self, item):
+        parent = self.parents.setdefault(item, item)
+        if parent == item:
+            return item
+        root = self.find(parent)
+        self.parents[item] = root
+        return root
+
+    def union(self, first, second):
+        first, second = self.find(first), self.find(second)
+        if first == second:
+            return
+        # the smaller tree goes under the larger one, so the trees stay shallow
+        if self.sizes.get(first, 1) < self.sizes.get(second, 1):
+            first, second = second, first
+        self.parents[second] = first
+        self.sizes[first] = self.sizes.get(first, 1) + self.sizes.get(second, 1)
+
+
+def find_duplicates(records):
+    # the names of each person that has more than one contact, sorted, with the
+    # keys they share: [(names, {'phone:0123456789', ...}), ...] ordered by the first name
+    owners = {}
+    shared = defaultdict(set)
+    groups = UnionFind()
+    for record in records:
+        name = record.name.value
+        for key in keys_of(record):
+            owner = owners.setdefault(key, name)
+            if owner != name:
+                groups.union(owner, name)
+                shared[owner].add(key)
+
+    clusters = defaultdict(list)
+    for name in list(groups.parents):
+        clusters[groups.find(name)].append(name)
+
+    reasons = defaultdict(set)
+    for owner, keys in shared.items():
+        reasons[groups.find(owner)].update(keys)
+
+    return sorted(((sorted(names), reasons[root]) for root, names in clusters.items()), key=lambda cluster: cluster[0])
@@ -0,0 +1,125 @@
+import csv
+import re
+
+# Contacts are exchanged as plain dicts of strings so that files can be read
+# and written one contact at a time, whatever the size of the address book.
+FIELDS = ('name', 'phones', 'birthday', 'email', 'address')
+PHONE_SEPARATORS = re.compile(r'[\s().-]')
+
+
+def format_of(path):
+    return 'vcard' if path.lower().endswith(('.vcf', '.vcard')) else 'csv'
+
+
+def split_phones(phones):
+    if not phones:
+        return []
+    return [phone if phone.isdigit() else PHONE_SEPARATORS.sub('', phone)
+            for phone in phones.split(';') if phone.strip()]
+
+
+def read_csv(file):
+    # yields (line number, fields); columns are matched by the header, and a
+    # missing column reads as empty so the row is rejected by validation instead
+    reader = csv.reader(file)
+    header = [column.strip().lower() for column in next(reader, [])]
+    positions = [(field, header.index(field) if field in header else None) for field in FIELDS]
+    for row in reader:
+        if not row:
+            continue
+        yield reader.line_num, {field: row[position].strip() if position is not None and position < len(row) else ''
+                                for field, position in positions}
+
+
+def write_csv(file, contacts):
+    writer = csv.DictWriter(file, FIELDS)
+    writer.writeheader()
+    count = 0
+    for fields in contacts:
+        writer.writerow(fields)
+        count += 1
+    return count
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace(',', '\\,').replace(';', '\\;')
+
+
+def unescape(value):
+    return re.sub(r'\\(.)', lambda match: '\n' if match.group(1) in 'nN' else match.group(1), value)
+
+
+def unfolded(file):
+    # vCard lines may be folded: a line starting with a space continues the previous one
+    number, line = 0, None
+    for number_read, text in enumerate(file, 1):
+        text = text.rstrip('\r\n')
+        if text[:1] in (' ', '\t') and line is not None:
+            line += text[1:]
+            continue
+        if line is not None:
+            yield number, line
+        number, line = number_read, text
+    if line is not None:
+        yield number, line
+
+
+def read_vcard(file):
+    fields, start = None, 0
+    for number, line in unfolded(file):
+        prop, _, value = line.partition(':')
+        prop = prop.split(';')[0].upper()
+        if prop == 'BEGIN':
+            fields, start = {field: '' for field in FIELDS}, number
+            phones = []
+        elif fields is None:
+            continue
+        elif prop == 'END':
+            fields['phones'] = ';'.join(phones)
+            yield start, fields
+            fields = None
+        elif prop == 'FN':
+            fields['name'] = unescape(value).strip()
+        elif prop == 'TEL':
+            phones.append(value.strip())
+        elif prop == 'BDAY':
+            fields['birthday'] = from_vcard_date(value.strip())
+        elif prop == 'EMAIL':
+            fields['email'] = value.strip()
+        elif prop == 'ADR':
+            parts = [unescape(part).strip() for part in re.split(r'(?<!\\);', value)]
+            fields['address'] = ', '.join(part for part in parts if part)
+
+
+def from_vcard_date(value):
+    # 1990-10-18 or 19901018 -> 18.10.1990; anything else is left for the validator
+    digits = value.replace('-', '')
+    if len(digits) == 8 and digits.isdigit():
+        return f'{digits[6:8]}.{digits[4:6]}.{digits[:4]}'
+    return value
+
+
+def to_vcard_date(value):
+    day, month, year = value.split('.')
+    return f'{year}-{int(month):02d}-{int(day):02d}'
+
+
+def write_vcard(file, contacts):
+    count = 0
+    for fields in contacts:
+        lines = ['BEGIN:VCARD', 'VERSION:3.0', f"FN:{escape(fields['name'])}", f"N:{escape(fields['name'])};;;;"]
+        lines.extend(f'TEL;TYPE=CELL:{phone}' for phone in split_phones(fields['phones']))
+        if fields['birthday']:
+            lines.append(f"BDAY:{to_vcard_date(fields['birthday'])}")
+        if fields['email']:
+            lines.append(f"EMAIL:{fields['email']}")
+        if fields['address']:
+            lines.append(f"ADR:;;{escape(fields['address'])};;;;")
+        lines.append('END:VCARD')
+        file.write('\r\n'.join(lines) + '\r\n')
+        count += 1
+    return count
+
+
+READERS = {'csv': read_csv, 'vcard': read_vcard}
+WRITERS = {'csv': write_csv, 'vcard': write_vcard}
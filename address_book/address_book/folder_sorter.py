@@ -1,8 +1,12 @@
+import argparse
+import errno
+import json
 import os
 import shutil
 import typing
-from pathlib import Path
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from collections import Counter, defaultdict
 
 
 CATEGORIES = {
@@ -31,41 +35,114 @@ CATEGORIES = {
 UNKNOWN_CATEGORY = 'unknown'
 CATEGORY_FOLDERS = [*CATEGORIES.keys(), UNKNOWN_CATEGORY]
 SUPPORTED_EXTENSIONS = set(sum([ext for ext in CATEGORIES.values()], []))
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+RULES_FILE = os.path.join(os.path.expanduser('~'), '.address_book', 'categories.json')
+
+# (offset, leading bytes, category) of common formats, for files whose extension says nothing
+MAGIC_NUMBERS = [
+    (0, b'\x89PNG\r\n\x1a\n', 'images'),
+    (0, b'\xff\xd8\xff', 'images'),
+    (0, b'GIF87a', 'images'),
+    (0, b'GIF89a', 'images'),
+    (0, b'%PDF-', 'documents'),
+    (0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'documents'),
+    (0, b'PK\x03\x04', 'archives'),
+    (0, b'\x1f\x8b', 'archives'),
+    (0, b'Rar!\x1a\x07', 'archives'),
+    (0, b"7z\xbc\xaf'\x1c", 'archives'),
+    (257, b'ustar', 'archives'),
+    (0, b'ID3', 'audio'),
+    (0, b'OggS', 'audio'),
+    (0, b'fLaC', 'audio'),
+    (8, b'WAVE', 'audio'),
+    (8, b'AVI ', 'video'),
+    (4, b'ftyp', 'video'),
+    (0, b'\x1aE\xdf\xa3', 'video'),
+    (0, b'MZ', 'executable'),
+    (0, b'\x7fELF', 'executable'),
+    (0, b'wOFF', 'fonts'),
+    (0, b'OTTO', 'fonts'),
+    (0, b'SQLite format 3\x00', 'databases'),
+    (0, b'#!', 'scripts'),
+    (0, b'<?xml', 'data'),
+    (0, b'd8:announce', 'torrents'),
+]
+MAGIC_SIZE = max(offset + len(magic) for offset, magic, _ in MAGIC_NUMBERS)
+
+
+class Classifier:
+    def __init__(self, categories: dict = CATEGORIES, sniff: bool = False):
+        self.extensions = {ext.lower(): category for category, ext_list in categories.items() for ext in ext_list}
+        self.folders = {*categories, UNKNOWN_CATEGORY}
+        self.sniff = sniff
+        # planning runs in one thread, so every sniffed file is read into the same buffer
+        self.buffer = bytearray(MAGIC_SIZE)
+
+    @classmethod
+    def from_rules_file(cls, rules_file: str = RULES_FILE, sniff: bool = False) -> 'Classifier':
+        # the rules file maps category names to extensions, e.g. {"images": [".heic"], "raw": [".cr2"]};
+        # an extension listed there is taken out of its default category
+        categories = {category: list(ext_list) for category, ext_list in CATEGORIES.items()}
+        if os.path.exists(rules_file):
+            with open(rules_file, encoding='utf-8') as file:
+                rules = json.load(file)
+
+            moved = {ext.lower() for ext_list in rules.values() for ext in ext_list}
+            for category, ext_list in categories.items():
+                categories[category] = [ext for ext in ext_list if ext.lower() not in moved]
+            for category, ext_list in rules.items():
+                categories.setdefault(category, []).extend(ext_list)
+
+        return cls(categories, sniff)
+
+    def is_known(self, ext: str) -> bool:
+        return ext.lower() in self.extensions
+
+    def classify(self, file_path: str, ext: str) -> str:
+        category = self.extensions.get(ext.lower())
+        if category is None and self.sniff:
+            category = self.sniff_category(file_path)
+        return category or UNKNOWN_CATEGORY
+
+    def sniff_category(self, file_path: str) -> typing.Optional[str]:
+        try:
+            with open(file_path, 'rb', buffering=0) as file:
+                size = file.readinto(self.buffer)
+        except OSError:
+            return None
+
+        header = memoryview(self.buffer)[:size]
+        for offset, magic, category in MAGIC_NUMBERS:
+            if header[offset:offset + len(magic)] == magic:
+                return category
+        return None
+
+
+DEFAULT_CLASSIFIER = Classifier()
 
 
 def _get_category_by_extension(ext: str) -> str:
-    for category_name, ext_list in CATEGORIES.items():
-        if ext in ext_list:
-            return category_name
+    return DEFAULT_CLASSIFIER.extensions.get(ext.lower(), UNKNOWN_CATEGORY)
 
-    return UNKNOWN_CATEGORY
-
-
-def _move_file(file_path: str, category_folder: str) -> typing.Tuple[str, bool]:
-    try:
-        shutil.move(file_path, category_folder)
-    except shutil.Error:
-        return file_path, True
 
+def _move_file(file_path: str, category_folder: str, same_device: bool = False) -> typing.Tuple[str, bool]:
     filename = os.path.basename(file_path)
     new_file_path = os.path.join(category_folder, filename)
 
-    return new_file_path, False
-
-
-def _check_if_path_is_part_of_category_folder(folder: str, path: str):
-    path = Path(path)
-
-    for category in CATEGORY_FOLDERS:
-        category_path = Path(os.path.join(folder, category))
+    if os.path.exists(new_file_path):
+        if os.path.samefile(file_path, new_file_path):
+            return file_path, True
+        raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), new_file_path)
 
-        if category_path == path or category_path in path.parents:
-            return True
+    if same_device:
+        os.rename(file_path, new_file_path)
+    else:
+        shutil.move(file_path, new_file_path)
 
-    return False
+    return new_file_path, False
 
 
-def _display_analytics(known, unknown, files, folders):
+def _display_analytics(known, unknown, files, folders, errors=()):
     print()
 
     for category, filenames in files.items():
@@ -86,48 +163,181 @@ def _display_analytics(known, unknown, files, folders):
     if unknown:
         print('Unknown file extensions: ', ', '.join(unknown))
 
-    print('All Done')
-
+    for file_path, error in errors:
+        print(f'Failed to move {file_path}: {error}')
 
-def sort_folder(target_folder_path: str, display_analytics: bool = False) -> None:
-    known = set()
-    unknown = set()
-    folders = defaultdict(list)
-    files = defaultdict(list)
+    print('All Done')
 
-    for dirpath, dirnames, filenames in os.walk(target_folder_path):
-        if not dirnames and not filenames:
-            os.rmdir(dirpath)
 
-        for filename in filenames:
-            _, ext = os.path.splitext(filename)
-            filename = os.path.join(dirpath, filename)
+class SortPlan:
+    def __init__(self, target_folder_path: str, classifier: Classifier):
+        self.target_folder_path = target_folder_path
+        self.classifier = classifier
+        # (file path, category, extension, whether it is on the target's device)
+        self.moves = []
+        self.categories = set()
+        self.empty_folders = []
+        self.folders_to_remove = []
+        self.conflicts = []
+
+
+def plan_sort(target_folder_path: str, classifier: Classifier = DEFAULT_CLASSIFIER) -> SortPlan:
+    plan = SortPlan(target_folder_path, classifier)
+    target_device = os.stat(target_folder_path).st_dev
+    destinations = set()
+
+    # (folder, whether it is kept: the target itself or a category folder and its subfolders)
+    stack = [(target_folder_path, True)]
+    while stack:
+        folder, kept = stack.pop()
+        same_device = os.stat(folder).st_dev == target_device
+        subfolders = []
+        is_empty = True
+
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                is_empty = False
+                if entry.is_dir(follow_symlinks=False):
+                    is_kept = kept if folder != target_folder_path else entry.name in classifier.folders
+                    if not is_kept and folder == target_folder_path:
+                        plan.folders_to_remove.append(entry.path)
+                    subfolders.append((entry.path, is_kept))
+                    continue
+                if entry.is_symlink() and entry.is_dir():
+                    continue
+
+                _, ext = os.path.splitext(entry.name)
+                category = classifier.classify(entry.path, ext)
+                destination = os.path.join(target_folder_path, category, entry.name)
+                if destination == entry.path:
+                    continue
+                # two files with the same name must not race for the same destination
+                if destination in destinations:
+                    plan.conflicts.append((entry.path, 'another file with this name is moved to the same folder'))
+                    continue
+
+                destinations.add(destination)
+                plan.categories.add(category)
+                plan.moves.append((entry.path, category, ext, same_device))
+
+        if is_empty and kept and folder != target_folder_path:
+            plan.empty_folders.append(folder)
+        # same order as os.walk: subfolders are visited in the order they are listed
+        stack.extend(reversed(subfolders))
+
+    return plan
+
+
+def _apply_move(target_folder_path: str, move: tuple):
+    file_path, category, _, same_device = move
+    category_folder = os.path.join(target_folder_path, category)
+    try:
+        return _move_file(file_path, category_folder, same_device) + (None,)
+    except OSError as error:
+        return file_path, True, error.strerror or str(error)
 
-            category = _get_category_by_extension(ext)
-            category_folder = os.path.join(target_folder_path, category)
 
-            os.makedirs(category_folder, exist_ok=True)
+def _remove_empty_folders(folder: str):
+    for dirpath, _, _ in os.walk(folder, topdown=False):
+        try:
+            os.rmdir(dirpath)
+        except OSError:
+            pass
 
-            new_file_path, is_same_file = _move_file(filename, category_folder)
 
-            if is_same_file:
-                continue
+def execute_plan(plan: SortPlan, display_analytics: bool = False, workers: int = 1) -> list:
+    target_folder_path = plan.target_folder_path
+    known = set()
+    unknown = set()
+    folders = defaultdict(list)
+    files = defaultdict(list)
+    errors = list(plan.conflicts)
+
+    for folder in plan.empty_folders:
+        os.rmdir(folder)
+    for category in plan.categories:
+        os.makedirs(os.path.join(target_folder_path, category), exist_ok=True)
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(partial(_apply_move, target_folder_path), plan.moves))
+    else:
+        results = [_apply_move(target_folder_path, move) for move in plan.moves]
+
+    for (file_path, category, ext, _), (new_file_path, is_same_file, error) in zip(plan.moves, results):
+        if error is not None:
+            errors.append((file_path, error))
+        if is_same_file:
+            continue
+
+        store = folders if os.path.isdir(new_file_path) else files
+        store[category].append(new_file_path)
+
+        if not ext:
+            ext = 'W/o extension'
+
+        if not plan.classifier.is_known(ext):
+            unknown.add(ext)
+        else:
+            known.add(ext)
+
+    # folders still holding a file that could not be moved are kept
+    kept = set()
+    for file_path, _ in errors:
+        parent = os.path.dirname(file_path)
+        while parent != target_folder_path and parent not in kept:
+            kept.add(parent)
+            parent = os.path.dirname(parent)
+
+    for folder in plan.folders_to_remove:
+        if folder in kept:
+            _remove_empty_folders(folder)
+        else:
+            shutil.rmtree(folder)
+            
+    if display_analytics:
+        _display_analytics(known, unknown, files, folders, errors)
 
-            store = folders if os.path.isdir(new_file_path) else files
-            store[category].append(new_file_path)
+    return errors
 
-            if not ext:
-                ext = 'W/o extension'
 
-            if ext not in SUPPORTED_EXTENSIONS:
-                unknown.add(ext)
-            else:
-                known.add(ext)
+def _display_plan(plan: SortPlan):
+    for file_path, category, _, _ in plan.moves:
+        print(f'{file_path} -> {category}')
+    for folder in plan.folders_to_remove:
+        print(f'{folder} will be removed')
+    for file_path, error in plan.conflicts:
+        print(f'{file_path} will be skipped: {error}')
+    print()
 
-    for dirpath, dirnames, filenames in os.walk(target_folder_path):
-        if dirpath != target_folder_path and not _check_if_path_is_part_of_category_folder(target_folder_path, dirpath):
-            shutil.rmtree(dirpath)
-            
-    if display_analytics:
-        _display_analytics(known, unknown, files, folders)
-    
\ No newline at end of file
+    for category, count in sorted(Counter(category for _, category, _, _ in plan.moves).items()):
+        print(f'Files to move to {category:15} {count}')
+    print(f'Files to move: {len(plan.moves)}, folders to remove: {len(plan.folders_to_remove)}, '
+          f'files to skip: {len(plan.conflicts)}')
+
+
+def sort_folder(target_folder_path: str, display_analytics: bool = False, workers: int = 1,
+                dry_run: bool = False, classifier: Classifier = DEFAULT_CLASSIFIER) -> list:
+    plan = plan_sort(target_folder_path, classifier)
+    if dry_run:
+        _display_plan(plan)
+        return plan.conflicts
+
+    return execute_plan(plan, display_analytics, workers)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sort files of a folder into category folders')
+    parser.add_argument('folder', help='folder to sort')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'number of files moved at the same time (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='print what would be moved and removed without touching the disk')
+    parser.add_argument('--rules', default=RULES_FILE,
+                        help=f'JSON file mapping categories to extensions (default: {RULES_FILE})')
+    parser.add_argument('--sniff', action='store_true',
+                        help='look at the first bytes of files with an unknown extension to find their category')
+    args = parser.parse_args()
+    classifier = Classifier.from_rules_file(args.rules, sniff=args.sniff)
+    sort_folder(args.folder, display_analytics=True, workers=args.workers, dry_run=args.dry_run,
+                classifier=classifier)
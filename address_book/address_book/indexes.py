@@ -0,0 +1,392 @@
+import re
+from bisect import bisect_left, insort
+from calendar import isleap
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+
+def birthday_in_year(month, day, year):
+    # people born on 29 February celebrate on the 28th in common years
+    if month == 2 and day == 29 and not isleap(year):
+        day = 28
+    return date(year, month, day)
+
+
+def birthday_key(birthday):
+    birthday_date = getattr(birthday, 'date', None)
+    if birthday_date is not None:
+        return birthday_date.month, birthday_date.day
+    if str(birthday) == 'Not set':
+        return None
+    day, month, _ = str(birthday).split('.')
+    return int(month), int(day)
+
+
+def upcoming_ranges(today, days):
+    # (month, day) ranges covering the 'days' days starting from today, in the
+    # order those days come
+    start = (today.month, today.day)
+    if days <= 0:
+        return []
+    if days > 365:
+        if start == (1, 1):
+            return [((1, 1), (12, 31))]
+        previous = date(2000, today.month, today.day) - timedelta(days=1)
+        return [(start, (12, 31)), ((1, 1), (previous.month, previous.day))]
+
+    last = today + timedelta(days=days - 1)
+    if last.year == today.year:
+        ranges = [(start, (last.month, last.day), today.year)]
+    else:
+        ranges = [(start, (12, 31), today.year), ((1, 1), (last.month, last.day), last.year)]
+
+    result = []
+    for first, end, year in ranges:
+        if end == (2, 28) and not isleap(year):
+            end = (2, 29)
+        result.append((first, end))
+    return result
+
+
+def edit_distance(a, b, limit):
+    # Levenshtein distance counting a swap of neighbouring letters as one edit;
+    # anything above 'limit' is reported as limit + 1. Only the cells at most
+    # 'limit' off the diagonal can stay within the limit, so only they are computed.
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    before, previous = None, [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [over] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        best = current[0]
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+            best = min(best, value)
+        if best > limit:
+            return over
+        before, previous = previous, current
+    return min(previous[-1], over)
+
+
+def halves(text):
+    # A name one typo away from the text starts with the part of it before its
+    # middle letter or ends with the part after it: a typo, a swap of
+    # neighbours included, spoils at most one of the two. A text of one or two
+    # letters only gets its first and last letter, which misses a few names.
+    if len(text) < 3:
+        return text[:1], text[-1:]
+    middle = len(text) // 2
+    return text[:middle], text[middle + 1:]
+
+
+def spellings(text):
+    # the ways a part of a name is usually capitalized, for searches that
+    # cannot fold case themselves
+    return sorted({text, text.lower(), text.upper(), text.capitalize(), text.title()})
+
+
+def closest(text, names, limit=5, max_distance=1):
+    # the names within 'max_distance' typos of the text, closest first; case does not count as a typo
+    folded = text.casefold()
+    ranked = []
+    for name in set(names):
+        if abs(len(name) - len(text)) > max_distance:
+            continue
+        distance = edit_distance(folded, name.casefold(), max_distance)
+        if distance <= max_distance:
+            ranked.append((distance, name))
+    ranked.sort()
+    return [name for _, name in ranked[:limit]]
+
+
+class GramIndex:
+    # Every key is filed under each of its substrings of length 'gram', so a
+    # substring search only has to check the keys that share a gram with it.
+
+    def __init__(self, gram):
+        self.gram = gram
+        self.grams = defaultdict(set)
+        self.short_keys = set()
+
+    def grams_of(self, text):
+        return {text[i:i + self.gram] for i in range(len(text) - self.gram + 1)}
+
+    def add(self, key):
+        if len(key) < self.gram:
+            self.short_keys.add(key)
+        for gram in self.grams_of(key):
+            self.grams[gram].add(key)
+
+    def remove(self, key):
+        self.short_keys.discard(key)
+        for gram in self.grams_of(key):
+            keys = self.grams[gram]
+            keys.discard(key)
+            if not keys:
+                del self.grams[gram]
+
+    def search(self, text):
+        if len(text) >= self.gram:
+            candidates = min((self.grams.get(gram, ()) for gram in self.grams_of(text)), key=len)
+            return {key for key in candidates if text in key}
+
+        # a short query is matched against the gram keys instead of the keys themselves
+        keys = {key for key in self.short_keys if text in key}
+        for gram, gram_keys in self.grams.items():
+            if text in gram:
+                keys.update(gram_keys)
+        return keys
+
+
+class PhoneIndex:
+    gram = 4
+
+    def __init__(self, records=()):
+        self.digits = GramIndex(self.gram)
+        self.owners = defaultdict(set)
+        self.phones = {}
+        for record in records:
+            self.update(record)
+
+    def update(self, record):
+        name = record.name.value
+        old_phones = self.phones.get(name, set())
+        new_phones = {phone.value for phone in record.phones}
+
+        for phone in old_phones - new_phones:
+            self.unlink(name, phone)
+        for phone in new_phones - old_phones:
+            self.link(name, phone)
+
+        if new_phones:
+            self.phones[name] = new_phones
+        else:
+            self.phones.pop(name, None)
+
+    def remove(self, name):
+        for phone in self.phones.pop(name, ()):
+            self.unlink(name, phone)
+
+    def link(self, name, phone):
+        owners = self.owners[phone]
+        if not owners:
+            self.digits.add(phone)
+        owners.add(name)
+
+    def unlink(self, name, phone):
+        owners = self.owners[phone]
+        owners.discard(name)
+        if not owners:
+            del self.owners[phone]
+            self.digits.remove(phone)
+
+    def search(self, digits):
+        names = set()
+        for phone in self.digits.search(digits):
+            names.update(self.owners[phone])
+        return names
+
+
+class NameIndex:
+    gram = 3
+    # a typo changes at most this many grams of a name (a swap of two letters)
+    grams_per_edit = 4
+
+    def __init__(self, names=()):
+        self.sorted_names = sorted(names)
+        self.substrings = GramIndex(self.gram)
+        for name in self.sorted_names:
+            self.substrings.add(name)
+        # a NameIndex of the case-folded names and the names behind each of
+        # them, for similar(); built the first time it is needed
+        self.folded = None
+        self.originals = None
+
+    def __contains__(self, name):
+        position = bisect_left(self.sorted_names, name)
+        return position < len(self.sorted_names) and self.sorted_names[position] == name
+
+    def add(self, name):
+        if name in self:
+            return
+        self.sorted_names.insert(bisect_left(self.sorted_names, name), name)
+        self.substrings.add(name)
+        if self.folded is not None:
+            self.originals[name.casefold()].add(name)
+            self.folded.add(name.casefold())
+
+    def remove(self, name):
+        if name not in self:
+            return
+        del self.sorted_names[bisect_left(self.sorted_names, name)]
+        self.substrings.remove(name)
+        if self.folded is not None:
+            names = self.originals[name.casefold()]
+            names.discard(name)
+            if not names:
+                del self.originals[name.casefold()]
+                self.folded.remove(name.casefold())
+
+    def prefixed(self, prefix):
+        position = bisect_left(self.sorted_names, prefix)
+        while position < len(self.sorted_names) and self.sorted_names[position].startswith(prefix):
+            yield self.sorted_names[position]
+            position += 1
+
+    def search(self, text):
+        # the exact name first, then names starting with the text, then the rest;
+        # the substring part is only computed if the caller reads that far
+        if text in self:
+            yield text
+        for name in self.prefixed(text):
+            if name != text:
+                yield name
+        for name in sorted(self.substrings.search(text)):
+            if not name.startswith(text):
+                yield name
+
+    def candidates(self, text, max_distance):
+        # Names that may be within 'max_distance' typos of the text. Such a
+        # name shares all but grams_per_edit * max_distance of the text's grams,
+        # so it is found under one of the rarest grams_per_edit * max_distance + 1
+        # of them, and only the names sharing enough grams are kept.
+        postings = self.substrings.grams
+        grams = sorted(self.substrings.grams_of(text), key=lambda gram: len(postings.get(gram, ())))
+        slack = self.grams_per_edit * max_distance
+        required = len(grams) - slack
+        if required > 0:
+            counts = Counter()
+            for gram in grams[:slack + 1]:
+                counts.update(postings.get(gram, ()))
+            rest = [postings.get(gram, ()) for gram in grams[slack + 1:]]
+            return [name for name, count in counts.items()
+                    if count >= required or count + sum(name in names for names in rest) >= required]
+
+        # too short for the grams to rule anything out: names sharing any
+        # of them, names starting the same way and the names shorter than a gram
+        candidates = set(self.substrings.short_keys)
+        for gram in grams:
+            candidates.update(postings.get(gram, ()))
+        candidates.update(self.prefixed(text[:1]))
+        return candidates
+
+    def similar(self, text, limit=5, max_distance=1):
+        # names within 'max_distance' typos of the text, closest first; case does not count as a typo
+        if self.folded is None:
+            self.originals = defaultdict(set)
+            for name in self.sorted_names:
+                self.originals[name.casefold()].add(name)
+            self.folded = NameIndex(self.originals)
+
+        candidates = self.folded.candidates(text.casefold(), max_distance)
+        return closest(text, (name for candidate in candidates for name in self.originals[candidate]), limit, max_distance)
+
+
+class BirthdayIndex:
+    # (month, day, name) triples kept sorted, so the birthdays of the next
+    # days are a couple of bisect ranges
+
+    def __init__(self, records=()):
+        self.birthdays = {}
+        for record in records:
+            key = birthday_key(record.birthday)
+            if key is not None:
+                self.birthdays[record.name.value] = key
+        self.keys = sorted((*key, name) for name, key in self.birthdays.items())
+
+    def update(self, record):
+        name = record.name.value
+        key = birthday_key(record.birthday)
+        if self.birthdays.get(name) == key:
+            return
+
+        self.remove(name)
+        if key is not None:
+            self.birthdays[name] = key
+            insort(self.keys, (*key, name))
+
+    def remove(self, name):
+        key = self.birthdays.pop(name, None)
+        if key is not None:
+            del self.keys[bisect_left(self.keys, (*key, name))]
+
+    def between(self, first, last):
+        # (month, day, name) of the birthdays from the (month, day) 'first' to 'last', inclusive
+        start = bisect_left(self.keys, first)
+        end = bisect_left(self.keys, (last[0], last[1] + 1))
+        return self.keys[start:end]
+
+    def upcoming(self, today, days):
+        for first, last in upcoming_ranges(today, days):
+            for _, _, name in self.between(first, last):
+                yield name
+
+
+def tokenize(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+class TextIndex:
+    # word -> {note id: weight}; every query word may be the beginning of an
+    # indexed word, and a note has to match all of the query words
+    title_weight = 3
+
+    def __init__(self, notes=None):
+        self.postings = defaultdict(dict)
+        self.words = []
+        self.documents = {}
+        for note_id, note in (notes or {}).items():
+            self.add(note_id, note)
+
+    def add(self, note_id, note):
+        self.remove(note_id)
+        weights = Counter(tokenize(note.text))
+        for word in tokenize(note.title):
+            weights[word] += self.title_weight
+
+        self.documents[note_id] = weights
+        for word, weight in weights.items():
+            if word not in self.postings:
+                insort(self.words, word)
+            self.postings[word][note_id] = weight
+
+    def remove(self, note_id):
+        for word in self.documents.pop(note_id, ()):
+            notes = self.postings[word]
+            del notes[note_id]
+            if not notes:
+                del self.postings[word]
+                del self.words[bisect_left(self.words, word)]
+
+    def prefixed(self, prefix):
+        position = bisect_left(self.words, prefix)
+        while position < len(self.words) and self.words[position].startswith(prefix):
+            yield self.words[position]
+            position += 1
+
+    def search(self, query):
+        scores = None
+        for term in set(tokenize(query)):
+            term_scores = defaultdict(int)
+            for word in self.prefixed(term):
+                # a whole-word hit counts for more than a prefix hit
+                bonus = 2 if word == term else 1
+                for note_id, weight in self.postings[word].items():
+                    term_scores[note_id] += weight * bonus
+
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {note_id: score + term_scores[note_id] for note_id, score in scores.items() if note_id in term_scores}
+            if not scores:
+                return []
+
+        if scores is None:
+            return list(self.documents)
+        return sorted(scores, key=lambda note_id: (-scores[note_id], note_id))
@@ -0,0 +1,395 @@
+import mmap
+import re
+import struct
+from collections.abc import MutableMapping
+from heapq import merge
+from classes import Record, Phone, Birthday, Email, Address
+from indexes import birthday_key, closest, halves, spellings
+
+# A read-optimized contacts snapshot, opened with mmap so that nothing is read
+# up front. Contacts are stored sorted by name:
+#
+#   header       magic, counts and the offsets of the sections below
+#   names        every name in UTF-8, each followed by a zero byte
+#   rows         per contact: where its name, email/address and phones are
+#   birthdays    per contact: the birthday as typed, padded to 10 bytes with zero bytes
+#   phones       10 digits per phone, contact after contact
+#   owners       per phone: the row of its contact
+#   birthday index  (month * 100 + day, row) for every birthday, sorted
+#   heap         per contact: email, a zero byte, address
+#
+# An exact name is a binary search over the rows, a phone or a name part is a
+# memory search over the phones or names section, and upcoming birthdays are a
+# binary search over the birthday index. A Record is built only when one is asked for.
+
+MAGIC = b'ABMAP001'
+HEADER = struct.Struct('<8s11Q')
+ROW = struct.Struct('<QIQIIH')
+OWNER = struct.Struct('<I')
+BIRTHDAY_ENTRY = struct.Struct('<HI')
+PHONE_WIDTH = 10
+BIRTHDAY_WIDTH = 10
+
+
+def month_day(record):
+    key = birthday_key(record.birthday)
+    return 0 if key is None else key[0] * 100 + key[1]
+
+
+def _optional(value):
+    value = str(value)
+    return '' if value == 'Not set' else value
+
+
+def write_mapped(file, records):
+    # 'records' have to come sorted by name
+    names, rows, birthdays, phones, owners, heap = (bytearray() for _ in range(6))
+    birthday_entries = []
+    count = phone_count = 0
+    for record in records:
+        name = record.name.value.encode('utf-8')
+        extra = (_optional(record.email) + '\0' + _optional(record.address)).encode('utf-8')
+        rows += ROW.pack(len(names), len(name), len(heap), len(extra), phone_count, len(record.phones))
+        names += name + b'\0'
+        heap += extra
+        for phone in record.phones:
+            phones += phone.value.encode('ascii')
+            owners += OWNER.pack(count)
+        phone_count += len(record.phones)
+
+        key = birthday_key(record.birthday)
+        if key is None:
+            birthdays += bytes(BIRTHDAY_WIDTH)
+        else:
+            birthdays += str(record.birthday).encode('ascii').ljust(BIRTHDAY_WIDTH, b'\0')
+            birthday_entries.append((key[0] * 100 + key[1], count))
+        count += 1
+
+    birthday_entries.sort()
+    birthday_index = b''.join(BIRTHDAY_ENTRY.pack(*entry) for entry in birthday_entries)
+
+    sections = [names, rows, birthdays, phones, owners, birthday_index, heap]
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(section)
+
+    file.write(HEADER.pack(MAGIC, count, phone_count, len(birthday_entries), *offsets, position))
+    for section in sections:
+        file.write(section)
+
+
+class MappedFile:
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.count, self.phone_count, self.birthday_count, self.names_at, self.rows_at,
+         self.birthdays_at, self.phones_at, self.owners_at, self.birthday_index_at, self.heap_at,
+         self.end) = HEADER.unpack_from(self.map)
+        if magic != MAGIC or self.end != len(self.map):
+            self.map.close()
+            raise ValueError(f'{path} is not a contacts map')
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.map.close()
+
+    def row(self, index):
+        return ROW.unpack_from(self.map, self.rows_at + index * ROW.size)
+
+    def name(self, index):
+        name_at, name_size, *_ = self.row(index)
+        start = self.names_at + name_at
+        return self.map[start:start + name_size]
+
+    def bisect(self, name):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.name(middle) < name:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find(self, name):
+        encoded = name.encode('utf-8')
+        index = self.bisect(encoded)
+        if index < self.count and self.name(index) == encoded:
+            return index
+        return None
+
+    def names(self):
+        for index in range(self.count):
+            yield self.name(index).decode('utf-8')
+
+    def record(self, index):
+        name_at, name_size, extra_at, extra_size, phones_start, phones_count = self.row(index)
+        start = self.names_at + name_at
+        record = Record(self.map[start:start + name_size].decode('utf-8'))
+
+        start = self.phones_at + phones_start * PHONE_WIDTH
+        record.phones = [Phone(self.map[position:position + PHONE_WIDTH].decode('ascii'))
+                         for position in range(start, start + phones_count * PHONE_WIDTH, PHONE_WIDTH)]
+
+        start = self.birthdays_at + index * BIRTHDAY_WIDTH
+        birthday = self.map[start:start + BIRTHDAY_WIDTH].rstrip(b'\0')
+        if birthday:
+            record.birthday = Birthday(birthday.decode('ascii'))
+
+        start = self.heap_at + extra_at
+        email, address = self.map[start:start + extra_size].decode('utf-8').split('\0')
+        if email:
+            record.email = Email(email)
+        if address:
+            record.address = Address(address)
+        return record
+
+    def prefixed(self, prefix):
+        encoded = prefix.encode('utf-8')
+        index = self.bisect(encoded)
+        while index < self.count and self.name(index).startswith(encoded):
+            yield index
+            index += 1
+
+    def containing(self, text):
+        # rows whose name contains the text, found by searching the names section
+        encoded = text.encode('utf-8')
+        position = self.map.find(encoded, self.names_at, self.rows_at)
+        while position != -1:
+            index = self.row_at_name_offset(position - self.names_at)
+            yield index
+            name_at, name_size, *_ = self.row(index)
+            position = self.map.find(encoded, self.names_at + name_at + name_size + 1, self.rows_at)
+
+    def ending(self, suffixes):
+        # rows whose name ends with one of the suffixes; every name is followed by a zero byte
+        pattern = re.compile(b'(?:' + b'|'.join(re.escape(suffix.encode('utf-8')) for suffix in suffixes) + b')\0')
+        for match in pattern.finditer(self.map, self.names_at, self.rows_at):
+            yield self.row_at_name_offset(match.start() - self.names_at)
+
+    def row_at_name_offset(self, offset):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.row(middle)[0] <= offset:
+                low = middle + 1
+            else:
+                high = middle
+        return low - 1
+
+    def with_phone(self, digits):
+        # rows with a phone containing the digits; a match has to lie within one phone
+        encoded = digits.encode('ascii')
+        found = set()
+        position = self.map.find(encoded, self.phones_at, self.owners_at)
+        while position != -1:
+            phone, offset = divmod(position - self.phones_at, PHONE_WIDTH)
+            if offset + len(encoded) <= PHONE_WIDTH:
+                found.add(OWNER.unpack_from(self.map, self.owners_at + phone * OWNER.size)[0])
+            position = self.map.find(encoded, position + 1, self.owners_at)
+        return found
+
+    def with_birthday(self, first, last):
+        # rows with a month * 100 + day key between first and last, in key order
+        def key_at(entry):
+            return BIRTHDAY_ENTRY.unpack_from(self.map, self.birthday_index_at + entry * BIRTHDAY_ENTRY.size)
+
+        low, high = 0, self.birthday_count
+        while low < high:
+            middle = (low + high) // 2
+            if key_at(middle)[0] < first:
+                low = middle + 1
+            else:
+                high = middle
+        while low < self.birthday_count:
+            key, index = key_at(low)
+            if key > last:
+                break
+            yield key, index
+            low += 1
+
+
+class MappedRecords(MutableMapping):
+    # Stand-in for AddressBook.data: contacts come from the mapped snapshot
+    # until they are changed. Every record handed out or written since the
+    # snapshot is kept in 'cache' and wins over the snapshot; names deleted
+    # from the snapshot are kept in 'deleted', names it does not have in 'added'.
+
+    def __init__(self, base=None):
+        self.base = base
+        self.book = None
+        self.cache = {}
+        self.deleted = set()
+        self.added = set()
+
+    def in_base(self, name):
+        return self.base is not None and self.base.find(name) is not None
+
+    def build(self, index, cache=True):
+        record = self.base.record(index)
+        record.book = self.book
+        if cache:
+            self.cache[record.name.value] = record
+        return record
+
+    def __getitem__(self, name):
+        if name in self.cache:
+            return self.cache[name]
+        if name in self.deleted or self.base is None:
+            raise KeyError(name)
+        index = self.base.find(name)
+        if index is None:
+            raise KeyError(name)
+        return self.build(index)
+
+    def __setitem__(self, name, record):
+        self.cache[name] = record
+        if self.in_base(name):
+            self.deleted.discard(name)
+        else:
+            self.added.add(name)
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self.cache.pop(name, None)
+        if self.in_base(name):
+            self.deleted.add(name)
+        else:
+            self.added.discard(name)
+
+    def __contains__(self, name):
+        if name in self.cache:
+            return True
+        return name not in self.deleted and self.in_base(name)
+
+    def __len__(self):
+        return (len(self.base) if self.base is not None else 0) - len(self.deleted) + len(self.added)
+
+    def __iter__(self):
+        if self.base is not None:
+            for name in self.base.names():
+                if name not in self.deleted:
+                    yield name
+        yield from sorted(self.added)
+
+    def values(self):
+        # full scans stream the snapshot without keeping its records around
+        if self.base is not None:
+            for index in range(len(self.base)):
+                name = self.base.name(index).decode('utf-8')
+                if name in self.deleted:
+                    continue
+                yield self.cache[name] if name in self.cache else self.build(index, cache=False)
+        for name in sorted(self.added):
+            yield self.cache[name]
+
+    def items(self):
+        return ((record.name.value, record) for record in self.values())
+
+    def snapshot_names(self, rows):
+        return [self.base.name(index).decode('utf-8') for index in rows]
+
+    def opened(self, names):
+        # Of names a worker found in the file, those of the snapshot opened here.
+        # The file may have been rewritten since, with names added and deleted
+        # in this session, and those are answered from 'cache' anyway.
+        return [name for name in names if self.in_base(name)]
+
+    def current(self, names, matches):
+        # the records of names found in the snapshot that are still current,
+        # plus the changed and added records that match now
+        found = {}
+        for name in names:
+            if name not in self.deleted and name not in self.cache:
+                found[name] = self[name]
+        for name, record in list(self.cache.items()):
+            if name not in found and matches(record):
+                found[name] = record
+        return found
+
+    def prefixed(self, prefix):
+        # current names starting with the prefix, sorted
+        names = self.snapshot_names(self.base.prefixed(prefix)) if self.base is not None else []
+        for name in merge(names, sorted(other for other in self.added if other.startswith(prefix))):
+            if name not in self.deleted:
+                yield name
+
+    def containing(self, text, names=None):
+        # current names containing the text, sorted; 'names' are those of the
+        # snapshot, if a worker has already searched it
+        if names is None:
+            names = self.snapshot_names(self.base.containing(text)) if self.base is not None else []
+        else:
+            names = sorted(self.opened(names))
+        for name in merge(names, sorted(other for other in self.added if text in other)):
+            if name not in self.deleted:
+                yield name
+
+    def similar(self, text, limit=5):
+        # names one typo away from the text, looked for among the names that
+        # start or end the way one of them has to
+        if not text:
+            return []
+        head, tail = halves(text)
+        rows = set()
+        if self.base is not None:
+            for spelling in spellings(head):
+                rows.update(self.base.prefixed(spelling))
+            rows.update(self.base.ending(spellings(tail)))
+        names = set(self.snapshot_names(rows)).union(self.added).difference(self.deleted)
+        return closest(text, names, limit)
+
+    def with_phone(self, digits, names=None):
+        # current records with a phone containing the digits, sorted by name
+        if names is None:
+            names = self.snapshot_names(self.base.with_phone(digits)) if self.base is not None else []
+        else:
+            names = self.opened(names)
+        found = self.current(names, lambda record: any(digits in phone.value for phone in record.phones))
+        return [found[name] for name in sorted(found)]
+
+    def with_birthday(self, first, last):
+        # current records with a month * 100 + day birthday key from first to last, in key and name order
+        rows = [index for _, index in self.base.with_birthday(first, last)] if self.base is not None else []
+        found = self.current(self.snapshot_names(rows), lambda record: first <= month_day(record) <= last)
+        return sorted(found.values(), key=lambda record: (month_day(record), record.name.value))
+
+    def freeze(self):
+        # what a snapshot written in the background needs: the current records sorted by name
+        base, cache, deleted, added = self.base, dict(self.cache), set(self.deleted), sorted(self.added)
+
+        def records():
+            added_names = iter(added)
+            next_added = next(added_names, None)
+            for index in range(len(base) if base is not None else 0):
+                name = base.name(index).decode('utf-8')
+                while next_added is not None and next_added < name:
+                    yield cache[next_added]
+                    next_added = next(added_names, None)
+                if name in deleted:
+                    continue
+                yield cache[name] if name in cache else base.record(index)
+            while next_added is not None:
+                yield cache[next_added]
+                next_added = next(added_names, None)
+
+        return records()
+
+
+def scan(path, kind, text):
+    # run by worker processes: the names in the snapshot at 'path' that have a
+    # phone ('phone') or a name ('name') containing the text
+    try:
+        base = MappedFile(path)
+    except (OSError, ValueError):
+        return []
+    try:
+        rows = base.with_phone(text) if kind == 'phone' else base.containing(text)
+        return [base.name(index).decode('utf-8') for index in rows]
+    finally:
+        base.close()
@@ -1,7 +1,10 @@
 from collections import UserDict, defaultdict
+from indexes import TextIndex
 
 
 class Tag:
+    __slots__ = ('name',)
+
     def __init__(self, name):
         self.name = name
     
@@ -14,16 +17,37 @@ class Tag:
     def __str__(self):
         return f'{self.name}'
 
+    def __getstate__(self):
+        return self.name
+
+    def __setstate__(self, state):
+        self.name = state['name'] if isinstance(state, dict) else state
+
 
 class Tags(UserDict):
-    
+    notes = None
+
+    def __init__(self):
+        super().__init__()
+        self.ids = {}
+
+    def restore(self, data):
+        self.data = data
+        self.ids = {tag.name: index for index, tag in data.items()}
+
+    def put(self, index, tag):
+        self.data[index] = tag
+        self.ids[tag.name] = index
+
     def add_tag(self, name):
-        new_tag = Tag(name)
-        if new_tag in self.data.values():
+        if name in self.ids:
             return f'Tag with name {name} already exists!'
         
+        new_tag = Tag(name)
         index = len(self.data) + 1 if len(self.data) > 0 else 1
-        self.data[index] = new_tag
+        self.put(index, new_tag)
+        if self.notes is not None:
+            self.notes.log('put_tag', index, new_tag)
         return f'Tag with name {name} succesfully created!'
     
     def get_tags(self):
@@ -35,8 +59,13 @@ class Tags(UserDict):
     def get_tag_name(self, tag_index):
         return self.data[tag_index].name
 
+    def get_tag_id(self, name):
+        return self.ids.get(name)
+
 
 class Item:
+    __slots__ = ('title', 'text')
+
     def __init__(self, title, text):
         self.title = title
         self.text = text
@@ -50,87 +79,195 @@ class Item:
         
         return self.title == item.title # and self.text == item.text
 
+    def __getstate__(self):
+        return self.title, self.text
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            state = state['title'], state['text']
+        self.title, self.text = state
+
 
 class Notes(UserDict):
+    storage = None
+    # set by every logged change, cleared by the storage once it has a snapshot with it
+    dirty = False
+    _text_index = None
 
     def __init__(self):
         super().__init__()
         self.tags = Tags()
+        self.tags.notes = self
         self.notes_tags = defaultdict(list)
+        self.tag_notes = defaultdict(set)
+        self.titles = {}
+        self.next_id = 1
+
+    def log(self, op, *args):
+        if self.storage is not None:
+            self.storage.log('notes', op, *args)
+        self.dirty = True
+
+    @property
+    def text_index(self):
+        if self._text_index is None:
+            self._text_index = TextIndex(self.data)
+        return self._text_index
+
+    def index(self, note_id):
+        if self._text_index is not None:
+            self._text_index.add(note_id, self.data[note_id])
+
+    def unindex(self, note_id):
+        if self._text_index is not None:
+            self._text_index.remove(note_id)
+
+    def drop_indexes(self):
+        self._text_index = None
+
+    def dump(self):
+        # copies, so that they can be pickled while the notes keep changing
+        return {'notes': dict(self.data), 'tags': dict(self.tags.data),
+                'notes_tags': {note_id: list(tag_ids) for note_id, tag_ids in self.notes_tags.items()}}
+
+    def restore(self, state):
+        # notes.bin used to hold only the notes themselves
+        if set(state) != {'notes', 'tags', 'notes_tags'}:
+            state = {'notes': state, 'tags': {}, 'notes_tags': {}}
+        self.data = state['notes']
+        self.titles = {note.title: note_id for note_id, note in self.data.items()}
+        self.next_id = max(self.data, default=0) + 1
+        self.tags.restore(state['tags'])
+        self.notes_tags = defaultdict(list, state['notes_tags'])
+        self.tag_notes = defaultdict(set)
+        for note_id, tag_ids in self.notes_tags.items():
+            for tag_id in tag_ids:
+                self.tag_notes[tag_id].add(note_id)
+        self.drop_indexes()
+
+    def apply(self, op, *args):
+        self.drop_indexes()
+        if op == 'put_note':
+            self.put_note(args[0], args[1])
+        elif op == 'delete_note':
+            self.drop_note(args[0])
+        elif op == 'put_tag':
+            self.tags.put(args[0], args[1])
+        elif op == 'link':
+            if args[1] not in self.notes_tags[args[0]]:
+                self.link(args[0], args[1])
+
+    def put_note(self, note_id, note):
+        self.data[note_id] = note
+        self.titles[note.title] = note_id
+        self.next_id = max(self.next_id, note_id + 1)
+        self.index(note_id)
+
+    def drop_note(self, note_id):
+        note = self.data.pop(note_id, None)
+        if note is not None:
+            del self.titles[note.title]
+            self.unlink_tags(note_id)
+            self.unindex(note_id)
+
+    def link(self, note_id, tag_id):
+        self.notes_tags[note_id].append(tag_id)
+        self.tag_notes[tag_id].add(note_id)
+
+    def unlink_tags(self, note_id):
+        for tag_id in self.notes_tags.pop(note_id, ()):
+            self.tag_notes[tag_id].discard(note_id)
 
     def add_note(self, title, text):
-        new_note = Item(title, text)
-        if new_note in self.data.values():
+        if title in self.titles:
             return f"Note with title {title} already exists!"
         
-        idx = len(self.data)+1 if len(self.data) > 0 else 1
-        self.data[idx] = new_note
+        new_note = Item(title, text)
+        idx = self.next_id
+        self.put_note(idx, new_note)
+        self.log('put_note', idx, new_note)
         return f"Note with title {title} was succesfully added!" # self.get_notes()
+
+    def add_notes(self, notes):
+        added = skipped = 0
+        for title, text in notes:
+            if title in self.titles:
+                skipped += 1
+                continue
+
+            new_note = Item(title, text)
+            idx = self.next_id
+            self.put_note(idx, new_note)
+            self.log('put_note', idx, new_note)
+            added += 1
+
+        return f"{added} notes were added, {skipped} skipped as already existing"
     
-    def get_notes(self, notes_id_list=None):
-        notes = '|{:^30}|{:^50}|{:^30}|\n'.format("Title", "Text", "Tags")
+    def rows(self, notes_id_list=None):
+        yield '|{:^30}|{:^50}|{:^30}|\n'.format("Title", "Text", "Tags")
         if notes_id_list == None or len(notes_id_list) == 0:
-            for key, value in self.data.items():
-                notes += '|{:^30}|{:<50}|{:^30}|\n'.format(value.title, value.text, self.get_note_tags(key))
+            notes = self.data.items()
         else:
-            for key, value in self.data.items():
-                if key in notes_id_list:
-                    notes += '|{:^30}|{:<50}|{:^30}|\n'.format(value.title, value.text, self.get_note_tags(key))
-        return notes
+            notes = ((key, self.data[key]) for key in notes_id_list)
+        for key, value in notes:
+            yield '|{:^30}|{:<50}|{:^30}|\n'.format(value.title, value.text, self.get_note_tags(key))
+
+    def get_notes(self, notes_id_list=None):
+        return ''.join(self.rows(notes_id_list))
 
     def find_notes(self, text_to_find):
-        text_to_find = text_to_find.lower()
-        notes_found = Notes()
-        for note in self.data.values():
-            if note.title.lower().find(text_to_find) != -1\
-                or note.text.lower().find(text_to_find) != -1:
-                notes_found.add_note(note.title, note.text)
-        
-        return notes_found
+        return self.text_index.search(text_to_find)
     
     def find_notes_by_tag(self, tag_name=None, tag_id=None):
         if tag_id == None and tag_name == None:
             return str()
+        if tag_id == None:
+            tag_id = self.get_tag_id(tag_name)
         
-        notes_found = list()
-        for node_id, tag_ids in self.notes_tags.items():
-            if tag_id in tag_ids:
-                notes_found.append(node_id)
+        if self.storage is not None and self.storage.indexed:
+            notes_found = self.storage.find_notes_by_tag(tag_id)
+        else:
+            notes_found = sorted(self.tag_notes.get(tag_id, ()))
 
+        if not notes_found:
+            return 'There is no notes with such tag'
         return self.get_notes(notes_id_list=notes_found)
 
-    def delete_note(self, title_text):
+    def match_note_id(self, title_text):
+        # an exact title is a dict lookup; only partial titles need a scan
+        note_id = self.titles.get(title_text.strip())
+        if note_id is not None:
+            return note_id
+
+        title_text = title_text.lower().strip()
         for id, note in self.data.items():
-            if title_text.lower().strip() in note.title.lower():
-                del self.data[id]
-                return "Removed note"
-        return "No note with such title"
+            if title_text in note.title.lower():
+                return id
+        return None
+
+    def delete_note(self, title_text):
+        id = self.match_note_id(title_text)
+        if id is None:
+            return "No note with such title"
+
+        self.drop_note(id)
+        self.log('delete_note', id)
+        return "Removed note"
     
     def edit_note(self, title_text, new_text):
-        for id, note in self.data.items():
-            if title_text.lower().strip() in note.title.lower() or title_text.lower().strip() in note.title.lower():
-                self.data[id] = Item(note.title, new_text)
-                return self.get_notes()
-        return "No note with such text"
+        id = self.match_note_id(title_text)
+        if id is None:
+            return "No note with such text"
+
+        self.put_note(id, Item(self.data[id].title, new_text))
+        self.log('put_note', id, self.data[id])
+        return self.get_notes()
 
     def get_note_id(self, note_title):
-        note = Item(note_title, None)
-        note_index = None
-        for key, value in self.data.items():
-            if value == note:
-                note_index = key
-                break
-        
-        return note_index
+        return self.titles.get(note_title)
     
     def get_tag_id(self, tag_name):
-        tag = Tag(tag_name)
-        tag_index = None
-        for key, value in self.tags.data.items():
-            if value == tag:
-                tag_index = key
-        
-        return tag_index
+        return self.tags.get_tag_id(tag_name)
 
     def add_tag_for_note(self, tag_name, note_title):
         note_index = self.get_note_id(note_title)
@@ -144,13 +281,14 @@ class Notes(UserDict):
         if tag_index in self.notes_tags[note_index]:
             return f"Tag '{tag_name}' was already linked to the note '{note_title}'."
         else:
-            self.notes_tags[note_index].append(tag_index)
+            self.link(note_index, tag_index)
+            self.log('link', note_index, tag_index)
             return f"Tag '{tag_name}' for the note '{note_title}' was created succesfully."
 
     def get_note_tags(self, note_id):
         tags = list()
         if note_id != None and note_id >= 0:
-            for tag in self.notes_tags[note_id]:
+            for tag in self.notes_tags.get(note_id, ()):
                 tags.append(self.tags.get_tag_name(tag))
         
         return ', '.join(tags)
\ No newline at end of file
@@ -1,10 +1,41 @@
-from bot import Bot
+import time
+STARTED = time.perf_counter()
+
+import argparse
 import sys
+from bot import Bot
 
 
 def run():
-    bot = Bot()
-    bot.run()
+    imported = time.perf_counter()
+    parser = argparse.ArgumentParser(prog='address-book')
+    parser.add_argument('--storage', choices=['pickle', 'mapped', 'sharded', 'sqlite'], default='pickle',
+                        help='where contacts and notes are kept (default: pickle)')
+    parser.add_argument('--shards', type=int, metavar='N',
+                        help='with --storage sharded, how many files contacts are split into when there are none yet '
+                             '(default: 4); existing files keep their number')
+    parser.add_argument('script', nargs='?',
+                        help="run the commands in this file, one per line with inline arguments, "
+                             "instead of prompting; '-' reads them from stdin")
+    parser.add_argument('--commit-every', type=int, default=0, metavar='N',
+                        help='with a script, commit storage every N commands as well as at the end')
+    parser.add_argument('--timings', action='store_true',
+                        help='print how long startup and loading contacts and notes take, to stderr')
+    args = parser.parse_args()
+
+    try:
+        bot = Bot(storage=args.storage, timings=args.timings, started=STARTED, shards=args.shards)
+    except ValueError as error:
+        parser.error(str(error))
+    bot.timing('imports', STARTED, imported)
+    bot.timing('init', imported)
+    if args.script is None:
+        bot.run()
+    elif args.script == '-':
+        bot.run_script(sys.stdin, args.commit_every)
+    else:
+        with open(args.script, encoding='utf-8') as script:
+            bot.run_script(script, args.commit_every)
 
 if __name__ == '__main__':
     run()
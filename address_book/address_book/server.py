@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import io
+import signal
+from contextlib import redirect_stdout
+from functools import partial
+from bot import Bot
+
+# Many sessions share one Bot, and with it one AddressBook, Notes and storage.
+# Commands arrive as lines with their arguments inline, as in a script, and
+# every command runs to completion on the event loop before the next one
+# starts. That serializes writes without locks, and a read never sees a
+# half-applied change. Sessions only wait on the network, so hundreds of
+# them fit on one core.
+# Replies are framed as '<length in bytes>\n<text>'.
+
+DEFAULT_PORT = 8765
+COMMIT_INTERVAL = 0.1
+
+
+class SessionClosed(Exception):
+    pass
+
+
+class SharedBot(Bot):
+    def exit(self):
+        # 'exit' ends the session that sent it; the server and its storage stay up
+        raise SessionClosed
+
+
+async def send(writer, text):
+    data = text.encode('utf-8')
+    writer.write(f'{len(data)}\n'.encode('ascii') + data)
+    await writer.drain()
+
+
+def run_command(bot, line):
+    # returns the output of the command and whether the session asked to close
+    output = io.StringIO()
+    closed = False
+    with redirect_stdout(output):
+        try:
+            bot.run_line(line)
+        except SessionClosed:
+            print('Good Bye')
+            closed = True
+    return output.getvalue(), closed
+
+
+async def serve_session(bot, reader, writer):
+    try:
+        await send(writer, 'Hello!\n' + bot.birthday(30))
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            line = line.decode('utf-8', errors='replace').strip()
+            if not line:
+                continue
+
+            output, closed = run_command(bot, line)
+            await send(writer, output)
+            if closed:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def commit_periodically(bot, interval):
+    # one commit for all the changes of the last interval instead of one per command
+    while True:
+        await asyncio.sleep(interval)
+        bot.storage.commit()
+
+
+async def serve(bot, host='127.0.0.1', port=DEFAULT_PORT, unix_path=None, commit_interval=COMMIT_INTERVAL):
+    handler = partial(serve_session, bot)
+    if unix_path is not None:
+        server = await asyncio.start_unix_server(handler, unix_path)
+    else:
+        server = await asyncio.start_server(handler, host, port)
+
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signal_number, stopped.set)
+        except (NotImplementedError, RuntimeError):
+            # no signal handlers on this platform; Ctrl+C still ends asyncio.run
+            pass
+
+    committer = asyncio.create_task(commit_periodically(bot, commit_interval))
+    try:
+        async with server:
+            await stopped.wait()
+    finally:
+        committer.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='address-book-server',
+                                     description='Serve one address book to many concurrent sessions')
+    parser.add_argument('--storage', choices=['pickle', 'mapped', 'sharded', 'sqlite'], default='pickle')
+    parser.add_argument('--shards', type=int, metavar='N')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', metavar='PATH', help='listen on a Unix socket instead of TCP')
+    args = parser.parse_args()
+
+    try:
+        bot = SharedBot(storage=args.storage, shards=args.shards)
+    except ValueError as error:
+        parser.error(str(error))
+    # loaded up front so that the first session does not pay for it
+    bot.book
+    bot.notes
+    try:
+        asyncio.run(serve(bot, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bot.storage.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,657 @@
+import os
+import pickle
+import re
+import threading
+import zlib
+from heapq import merge
+from collections.abc import MutableMapping
+from datetime import date
+from classes import AddressBook, Record, Phone, Birthday, Email, Address
+from notes import Item, Tag
+from indexes import upcoming_ranges, birthday_key, closest, halves, spellings
+
+
+AUTOSAVE_INTERVAL = 60
+
+
+class PickleStorage:
+    # Each entity lives in a pickled snapshot ('contacts.bin') plus an
+    # append-only journal of changes made since that snapshot ('contacts.bin.log').
+    # Once the journal has more entries than both 'compact_every' and the
+    # entity had at its last snapshot, it is folded into a fresh snapshot by a
+    # background thread, which keeps the amortized cost of a change constant. Besides that, an
+    # autosave thread snapshots every entity that changed, every
+    # 'autosave_interval' seconds, so the journals stay short in quiet sessions too.
+    indexed = False
+
+    def __init__(self, contacts_file, notes_file, compact_every=1000, autosave_interval=AUTOSAVE_INTERVAL):
+        self.files = {'contacts': contacts_file, 'notes': notes_file}
+        self.compact_every = compact_every
+        self.autosave_interval = autosave_interval
+        self.entities = {}
+        self.journals = {}
+        self.pending = {}
+        # the size of each entity when it was last snapshotted (or read)
+        self.sizes = {}
+        self.compactions = {}
+        self.lock = threading.RLock()
+        self.stopped = threading.Event()
+        self.autosave = None
+
+    def load(self, kind, entity):
+        path = self.files[kind]
+        found = self.read(kind, entity)
+        self.sizes[kind] = len(entity.data)
+        interrupted = os.path.exists(path + '.log.old')
+        replayed = self.replay(path + '.log.old', entity) + self.replay(path + '.log', entity)
+
+        entity.storage = self
+        entity.dirty = replayed > 0
+        self.entities[kind] = entity
+        self.journals[kind] = open(path + '.log', 'ab')
+        self.pending[kind] = replayed
+
+        if interrupted:
+            # the previous session died in the middle of a compaction
+            self.snapshot(kind)
+
+        if self.autosave is None and self.autosave_interval:
+            self.autosave = threading.Thread(target=self.autosave_loop, daemon=True)
+            self.autosave.start()
+
+        return found or replayed > 0
+
+    def read(self, kind, entity):
+        try:
+            with open(self.files[kind], 'rb') as file:
+                entity.restore(pickle.load(file))
+                return True
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False
+
+    def autosave_loop(self):
+        while not self.stopped.wait(self.autosave_interval):
+            for kind, entity in list(self.entities.items()):
+                if entity.dirty:
+                    self.compact(kind)
+
+    def replay(self, journal_path, entity):
+        count = 0
+        try:
+            file = open(journal_path, 'rb+')
+        except OSError:
+            return count
+
+        with file:
+            good_offset = 0
+            while True:
+                try:
+                    op, args = pickle.load(file)
+                except (EOFError, pickle.UnpicklingError, ValueError, AttributeError):
+                    break
+                entity.apply(op, *args)
+                good_offset = file.tell()
+                count += 1
+            # drop a record torn by a crash so that new entries stay readable
+            file.truncate(good_offset)
+
+        return count
+
+    def log(self, kind, op, *args):
+        with self.lock:
+            pickle.dump((op, args), self.journals[kind])
+            # a batch counts as many changes as it holds, so it triggers compaction as often
+            self.pending[kind] += len(args[0]) if op == 'put_many' else 1
+            compact = self.pending[kind] >= max(self.compact_every, self.sizes[kind])
+
+        if compact:
+            self.compact(kind)
+
+    def commit(self):
+        with self.lock:
+            for journal in self.journals.values():
+                journal.flush()
+
+    def compact(self, kind):
+        # called from both the prompt and the autosave thread; one snapshot per entity at a time
+        with self.lock:
+            compaction = self.compactions.get(kind)
+            if compaction is not None and compaction.is_alive():
+                return
+            if kind not in self.journals:
+                return
+
+            compaction = threading.Thread(target=self.snapshot, args=(kind,))
+            self.compactions[kind] = compaction
+            compaction.start()
+
+    def snapshot(self, kind):
+        # Only switching journals and copying the entity happen under the lock;
+        # the slow part, pickling and writing, runs while changes keep coming.
+        # A change made meanwhile may or may not be in the snapshot, but it is
+        # in the new journal either way, and replaying it is idempotent.
+        path = self.files[kind]
+        entity = self.entities[kind]
+        with self.lock:
+            self.journals[kind].close()
+            os.replace(path + '.log', path + '.log.old')
+            self.journals[kind] = open(path + '.log', 'ab')
+            self.pending[kind] = 0
+            self.sizes[kind] = len(entity.data)
+            state = self.state(kind)
+            entity.dirty = False
+
+        with open(path + '.tmp', 'wb') as file:
+            self.write(file, kind, state)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + '.tmp', path)
+        os.remove(path + '.log.old')
+
+    def state(self, kind):
+        return self.entities[kind].dump()
+
+    def find_notes_by_tag(self, tag_id):
+        # for subclasses that answer queries themselves; notes are in memory either way
+        return sorted(self.entities['notes'].tag_notes.get(tag_id, ()))
+
+    def write(self, file, kind, state):
+        file.write(pickle.dumps(state))
+
+    def close(self):
+        self.stopped.set()
+        if self.autosave is not None:
+            self.autosave.join()
+        for compaction in list(self.compactions.values()):
+            compaction.join()
+
+        with self.lock:
+            for journal in self.journals.values():
+                journal.close()
+            self.journals.clear()
+
+
+
+class MappedStorage(PickleStorage):
+    # Contacts are snapshotted in the mapped format of mapped.py instead of a
+    # pickle, so opening the book reads nothing but a header and a lookup
+    # builds only the records it returns. The journal and its compaction work
+    # as for PickleStorage; notes are still pickled.
+    indexed = True
+    # the kinds kept in the mapped format
+    mapped = ('contacts',)
+
+    def read(self, kind, entity):
+        if kind not in self.mapped:
+            return super().read(kind, entity)
+        # mapped.py (and mmap) is imported by the storages that use it, not with this module
+        from mapped import MappedFile, MappedRecords
+        try:
+            base = MappedFile(self.files[kind])
+        except (OSError, ValueError):
+            base = None
+        records = MappedRecords(base)
+        records.book = entity
+        entity.data = records
+        entity.drop_indexes()
+        return base is not None and len(base) > 0
+
+    def log(self, kind, op, *args):
+        # the book does not keep new records itself when the storage is indexed;
+        # they go into the overlay before the journal, so a snapshot taken in between has them
+        if kind in self.mapped and op in ('put', 'put_many'):
+            records = self.entities[kind].data
+            for record in (args if op == 'put' else args[0]):
+                records[record.name.value] = record
+        super().log(kind, op, *args)
+
+    def state(self, kind):
+        if kind not in self.mapped:
+            return super().state(kind)
+        return self.entities[kind].data.freeze()
+
+    def write(self, file, kind, state):
+        if kind not in self.mapped:
+            return super().write(file, kind, state)
+        from mapped import write_mapped
+        write_mapped(file, state)
+
+    def find_contacts(self, name):
+        # same order as NameIndex.search: exact, prefix, then any other substring
+        records = self.entities['contacts'].data
+        if name in records:
+            yield records[name]
+        for found in records.prefixed(name):
+            if found != name:
+                yield records[found]
+        for found in records.containing(name):
+            if not found.startswith(name):
+                yield records[found]
+
+    def search_phone(self, digits):
+        return self.entities['contacts'].data.with_phone(digits)
+
+    def suggest(self, name, limit=5):
+        return self.entities['contacts'].data.similar(name, limit)
+
+    def birthdays(self, days):
+        records = self.entities['contacts'].data
+        result = []
+        for (first_month, first_day), (last_month, last_day) in upcoming_ranges(date.today(), days):
+            result.extend(records.with_birthday(first_month * 100 + first_day, last_month * 100 + last_day))
+        return result
+
+
+# used when there are no shard files yet; afterwards their names say how many there are
+DEFAULT_SHARDS = 4
+
+
+class ShardedRecords(MutableMapping):
+    # Stand-in for AddressBook.data: every name lives in the shard its hash picks
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def shard(self, name):
+        return self.storage.shard_of(name).data
+
+    def __getitem__(self, name):
+        return self.shard(name)[name]
+
+    def __setitem__(self, name, record):
+        self.shard(name)[name] = record
+
+    def __delitem__(self, name):
+        del self.shard(name)[name]
+
+    def __contains__(self, name):
+        return name in self.shard(name)
+
+    def __iter__(self):
+        for shard in self.storage.shards:
+            yield from shard.data
+
+    def __len__(self):
+        return sum(len(shard.data) for shard in self.storage.shards)
+
+    def values(self):
+        for shard in self.storage.shards:
+            yield from shard.data.values()
+
+
+class ShardedStorage(MappedStorage):
+    # Contacts are split into 'shards' mapped snapshots by a hash of the name
+    # ('contacts-0-of-4.map', ...), each with its own journal, so a change only
+    # makes its own shard be written again. Opening a shard maps it, so loading
+    # does not grow with the book. Searches for a phone or a part of a name
+    # scan the shard files in a pool of worker processes, one shard per task,
+    # which hand back only the names they found; exact names go to their one
+    # shard, and birthdays are a binary search per shard.
+
+    def __init__(self, contacts_file, notes_file, shards=None, workers=None, **options):
+        super().__init__(contacts_file, notes_file, **options)
+        root, extension = os.path.splitext(contacts_file)
+        existing = existing_shards(root, extension)
+        if shards is None:
+            shards = existing or DEFAULT_SHARDS
+        elif existing and existing != shards:
+            raise ValueError(f'{contacts_file} is split into {existing} shards, not {shards}')
+
+        self.shard_kinds = [f'contacts-{number}' for number in range(shards)]
+        for number, kind in enumerate(self.shard_kinds):
+            self.files[kind] = f'{root}-{number}-of-{shards}{extension}'
+        self.mapped = tuple(self.shard_kinds)
+        self.workers = workers if workers is not None else min(shards, os.cpu_count() or 1)
+        self.pool = None
+        self.shards = []
+        self.book = None
+
+    def load(self, kind, entity):
+        if kind != 'contacts':
+            return super().load(kind, entity)
+
+        found = False
+        self.shards = []
+        for shard_kind in self.shard_kinds:
+            shard = AddressBook()
+            found = super().load(shard_kind, shard) or found
+            # records replayed from the journal belong to the whole book, not to the shard
+            shard.data.book = entity
+            for record in shard.data.cache.values():
+                record.book = entity
+            self.shards.append(shard)
+
+        entity.data = ShardedRecords(self)
+        entity.drop_indexes()
+        entity.storage = self
+        self.book = entity
+        return found
+
+    def number_of(self, name):
+        # crc32 rather than hash(), which differs from one process to the next
+        return zlib.crc32(name.encode('utf-8')) % len(self.shard_kinds)
+
+    def shard_of(self, name):
+        return self.shards[self.number_of(name)]
+
+    def log(self, kind, op, *args):
+        if kind != 'contacts':
+            return super().log(kind, op, *args)
+
+        if op == 'delete':
+            number = self.number_of(args[0])
+            self.shards[number].dirty = True
+            return super().log(self.shard_kinds[number], op, *args)
+
+        batches = {}
+        for record in (args if op == 'put' else args[0]):
+            batches.setdefault(self.number_of(record.name.value), []).append(record)
+        for number, records in batches.items():
+            self.shards[number].dirty = True
+            if op == 'put':
+                super().log(self.shard_kinds[number], op, *records)
+            else:
+                super().log(self.shard_kinds[number], op, records)
+
+    def scan(self, kind, text):
+        # per shard, the names in its file whose phone or name contains the text, or
+        # None for every shard when there is a single worker and the shards search themselves
+        if self.workers < 2:
+            return [None] * len(self.shards)
+        if self.pool is None:
+            # imported here: they take longer to import than the rest of the storages together
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # not plain fork: this process runs autosave and compaction threads
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=context)
+        from mapped import scan
+        return list(self.pool.map(scan, [self.files[shard_kind] for shard_kind in self.shard_kinds],
+                                  [kind] * len(self.shards), [text] * len(self.shards)))
+
+    def find_contacts(self, name):
+        # same order as NameIndex.search: exact, prefix, then any other substring
+        records = self.book.data
+        if name in records:
+            yield records[name]
+        for found in merge(*(shard.data.prefixed(name) for shard in self.shards)):
+            if found != name:
+                yield records[found]
+
+        scanned = self.scan('name', name)
+        for found in merge(*(shard.data.containing(name, names) for shard, names in zip(self.shards, scanned))):
+            if not found.startswith(name):
+                yield records[found]
+
+    def search_phone(self, digits):
+        scanned = self.scan('phone', digits)
+        return list(merge(*(shard.data.with_phone(digits, names) for shard, names in zip(self.shards, scanned)),
+                          key=lambda record: record.name.value))
+
+    def suggest(self, name, limit=5):
+        return closest(name, (found for shard in self.shards for found in shard.data.similar(name, limit)), limit)
+
+    def birthdays(self, days):
+        from mapped import month_day
+        result = []
+        for (first_month, first_day), (last_month, last_day) in upcoming_ranges(date.today(), days):
+            first, last = first_month * 100 + first_day, last_month * 100 + last_day
+            result.extend(merge(*(shard.data.with_birthday(first, last) for shard in self.shards),
+                                key=lambda record: (month_day(record), record.name.value)))
+        return result
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        super().close()
+
+
+def existing_shards(root, extension):
+    # how many shards the files of an earlier session were split into, or None if there are none
+    folder, name = os.path.split(root)
+    pattern = re.compile(re.escape(name) + r'-\d+-of-(\d+)' + re.escape(extension) + r'(\.log)?$')
+    try:
+        names = os.listdir(folder or '.')
+    except OSError:
+        return None
+    counts = {int(match.group(1)) for match in map(pattern.match, names) if match is not None}
+    if len(counts) > 1:
+        raise ValueError(f'there are shard files of {root}{extension} for {sorted(counts)} shards')
+    return counts.pop() if counts else None
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    name TEXT PRIMARY KEY,
+    birthday TEXT,
+    birthday_key INTEGER,
+    email TEXT,
+    address TEXT,
+    name_reversed TEXT
+);
+CREATE INDEX IF NOT EXISTS contacts_birthday ON contacts (birthday_key);
+CREATE INDEX IF NOT EXISTS contacts_email ON contacts (email);
+CREATE TABLE IF NOT EXISTS phones (
+    name TEXT NOT NULL REFERENCES contacts (name) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    phone TEXT NOT NULL,
+    PRIMARY KEY (name, position)
+);
+DROP INDEX IF EXISTS phones_phone;
+CREATE INDEX IF NOT EXISTS phones_phone_name ON phones (phone, name);
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    text TEXT
+);
+CREATE INDEX IF NOT EXISTS notes_title ON notes (title);
+CREATE TABLE IF NOT EXISTS tags (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tags_name ON tags (name);
+CREATE TABLE IF NOT EXISTS notes_tags (
+    note_id INTEGER NOT NULL REFERENCES notes (id) ON DELETE CASCADE,
+    tag_id INTEGER NOT NULL REFERENCES tags (id),
+    PRIMARY KEY (note_id, tag_id)
+);
+CREATE INDEX IF NOT EXISTS notes_tags_tag ON notes_tags (tag_id);
+"""
+
+CONTACT_COLUMNS = """
+    SELECT name, birthday, email, address,
+           (SELECT group_concat(phone) FROM
+               (SELECT phone FROM phones WHERE phones.name = contacts.name ORDER BY position))
+    FROM contacts
+"""
+
+
+def _optional(value):
+    value = str(value)
+    return None if value == 'Not set' else value
+
+
+def _birthday_key(birthday):
+    key = birthday_key(birthday)
+    if key is None:
+        return None
+    return key[0] * 100 + key[1]
+
+
+class SQLiteRecords(MutableMapping):
+    # Stand-in for AddressBook.data: records are read from the database on
+    # demand instead of being loaded up front. Writes reach the database
+    # through SQLiteStorage.log, so assignment here only keeps the object.
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.cache = {}
+
+    def build(self, row, cache=True):
+        name, birthday, email, address, phones = row
+        if name in self.cache:
+            return self.cache[name]
+
+        record = Record(name,
+                        birthday=Birthday(birthday) if birthday else None,
+                        email=Email(email) if email else None,
+                        address=Address(address) if address else None)
+        record.phones = [Phone(phone) for phone in phones.split(',')] if phones else []
+        record.book = self.storage.entities.get('contacts')
+        if cache:
+            self.cache[name] = record
+        return record
+
+    def select(self, where='', params=(), cache=True):
+        cursor = self.storage.connection.execute(CONTACT_COLUMNS + where, params)
+        for row in cursor:
+            yield self.build(row, cache)
+
+    def __getitem__(self, name):
+        if name in self.cache:
+            return self.cache[name]
+        for record in self.select('WHERE name = ?', (name,)):
+            return record
+        raise KeyError(name)
+
+    def __setitem__(self, name, record):
+        self.cache[name] = record
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self.cache.pop(name, None)
+
+    def __contains__(self, name):
+        row = self.storage.connection.execute('SELECT 1 FROM contacts WHERE name = ?', (name,)).fetchone()
+        return row is not None
+
+    def __iter__(self):
+        for (name,) in self.storage.connection.execute('SELECT name FROM contacts ORDER BY rowid'):
+            yield name
+
+    def __len__(self):
+        return self.storage.connection.execute('SELECT count(*) FROM contacts').fetchone()[0]
+
+    def values(self):
+        # full scans stream the rows without keeping every record around
+        return self.select('ORDER BY rowid', cache=False)
+
+    def items(self):
+        return ((record.name.value, record) for record in self.values())
+
+
+class SQLiteStorage:
+    # Contacts stay in the database and are fetched per query; notes are
+    # small enough to be read into memory but are written through as well.
+    indexed = True
+
+    def __init__(self, database_file):
+        import sqlite3
+        self.connection = sqlite3.connect(database_file, check_same_thread=False)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.executescript(SCHEMA)
+        columns = {column for _, column, *_ in self.connection.execute('PRAGMA table_info(contacts)')}
+        if 'name_reversed' not in columns:
+            # a database from before names were also looked up by their ending
+            self.connection.execute('ALTER TABLE contacts ADD COLUMN name_reversed TEXT')
+            self.connection.executemany('UPDATE contacts SET name_reversed = ? WHERE name = ?',
+                                        [(name[::-1], name) for (name,) in self.connection.execute('SELECT name FROM contacts')])
+        self.connection.execute('CREATE INDEX IF NOT EXISTS contacts_name_reversed ON contacts (name_reversed)')
+        self.connection.commit()
+        self.entities = {}
+
+    def load(self, kind, entity):
+        if kind == 'contacts':
+            entity.data = SQLiteRecords(self)
+            found = len(entity.data) > 0
+        else:
+            notes = {note_id: Item(title, text) for note_id, title, text
+                     in self.connection.execute('SELECT id, title, text FROM notes')}
+            tags = {tag_id: Tag(name) for tag_id, name in self.connection.execute('SELECT id, name FROM tags')}
+            notes_tags = {}
+            for note_id, tag_id in self.connection.execute('SELECT note_id, tag_id FROM notes_tags ORDER BY rowid'):
+                notes_tags.setdefault(note_id, []).append(tag_id)
+            entity.restore({'notes': notes, 'tags': tags, 'notes_tags': notes_tags})
+            found = len(notes) > 0
+
+        entity.storage = self
+        self.entities[kind] = entity
+        return found
+
+    def log(self, kind, op, *args):
+        execute = self.connection.execute
+        if op == 'put':
+            self.put_records(args)
+        elif op == 'put_many':
+            self.put_records(args[0])
+        elif op == 'delete':
+            execute('DELETE FROM contacts WHERE name = ?', (args[0],))
+        elif op == 'put_note':
+            execute('INSERT OR REPLACE INTO notes (id, title, text) VALUES (?, ?, ?)', (args[0], args[1].title, args[1].text))
+        elif op == 'delete_note':
+            execute('DELETE FROM notes WHERE id = ?', (args[0],))
+        elif op == 'put_tag':
+            execute('INSERT OR REPLACE INTO tags (id, name) VALUES (?, ?)', (args[0], args[1].name))
+        elif op == 'link':
+            execute('INSERT OR IGNORE INTO notes_tags (note_id, tag_id) VALUES (?, ?)', args)
+
+    def put_records(self, records):
+        executemany = self.connection.executemany
+        executemany('INSERT INTO contacts (name, birthday, birthday_key, email, address, name_reversed) '
+                    'VALUES (?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT (name) DO UPDATE SET birthday = excluded.birthday, birthday_key = excluded.birthday_key, '
+                    'email = excluded.email, address = excluded.address',
+                    [(record.name.value, _optional(record.birthday), _birthday_key(record.birthday),
+                      _optional(record.email), _optional(record.address), record.name.value[::-1]) for record in records])
+        executemany('DELETE FROM phones WHERE name = ?', [(record.name.value,) for record in records])
+        executemany('INSERT INTO phones (name, position, phone) VALUES (?, ?, ?)',
+                    [(record.name.value, position, phone.value) for record in records
+                     for position, phone in enumerate(record.phones)])
+
+    def find_contacts(self, name):
+        # same order as NameIndex.search: exact, prefix, then any other substring
+        records = self.entities['contacts'].data
+        yield from records.select('WHERE name = ?', (name,))
+        yield from records.select('WHERE name > ? AND name < ? ORDER BY name', (name, name + '\U0010ffff'))
+        yield from records.select('WHERE instr(name, ?) > 1 ORDER BY name', (name,))
+
+    def search_phone(self, digits):
+        # phones starting with the digits are a range of the index; those containing
+        # them further on still take a scan, but of the index rather than the table
+        records = self.entities['contacts'].data
+        return list(records.select('WHERE name IN (SELECT name FROM phones WHERE phone >= ? AND phone < ? '
+                                   'UNION SELECT name FROM phones WHERE instr(phone, ?) > 1) ORDER BY name',
+                                   (digits, digits + '\U0010ffff', digits)))
+
+    def suggest(self, name, limit=5):
+        # names one typo away, looked for among those that start or end the way
+        # one of them has to: ranges of the name index and of the reversed name index
+        if not name:
+            return []
+        head, tail = halves(name)
+        ranges = ([('name', spelling) for spelling in spellings(head)]
+                  + [('name_reversed', spelling[::-1]) for spelling in spellings(tail)])
+        query = ' UNION '.join(f'SELECT name FROM contacts WHERE {column} >= ? AND {column} < ?' for column, _ in ranges)
+        params = [bound for _, start in ranges for bound in (start, start + '\U0010ffff')]
+        return closest(name, (found for (found,) in self.connection.execute(query, params)), limit)
+
+    def birthdays(self, days):
+        records = self.entities['contacts'].data
+        result = []
+        for (first_month, first_day), (last_month, last_day) in upcoming_ranges(date.today(), days):
+            result.extend(records.select('WHERE birthday_key BETWEEN ? AND ? ORDER BY birthday_key, name',
+                                         (first_month * 100 + first_day, last_month * 100 + last_day)))
+        return result
+
+    def find_notes_by_tag(self, tag_id):
+        return [note_id for (note_id,) in self.connection.execute('SELECT note_id FROM notes_tags WHERE tag_id = ? ORDER BY note_id', (tag_id,))]
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()